@@ -40,25 +40,149 @@ Aew5044@gmail.com
 download_space = r"C:\Users\aew50\Downloads"
 py_space = r"C:\Python\Grants_dot_gov"
 
+# Set to False to extract the XML into py_space before parsing it.
+# When True the XML is read straight out of the zip, and the zip is
+# kept in download_space only as a cache for later runs.
+stream_zip = True
+
+# When today's extract is not published yet, use the newest extract of the
+# previous fallback_days days instead
+fallback_days = 3
+
+# Where the extracts are downloaded from; None is grants.gov. Point it at a
+# local HTTP server (e.g. over benchmarks/synthetic_extract.py output) to run
+# offline.
+base_url = None
+
+# Cleaned frames are cached here per extract date, so a warm run skips the
+# download, the XML parse and clean_df. Only the newest days are kept.
+cache_space = py_space + r"\cache"
+snapshot_keep_days = 7
+
+# When True, only opportunities that are new or changed since the previous
+# extract are cleaned; the rest come from the store in store_space, and the
+# day's changes are written there as GrantsDBDelta{date}.arrow.
+incremental = True
+store_space = py_space + r"\store"
+
+# Indexed SQLite copy of the cleaned data for repeated filters from other
+# processes (see opportunity_store.query_opportunities)
+store_db = py_space + r"\grants.sqlite"
+
+# Append each extract's changes to the history archive, so any earlier day
+# can be queried with history_archive.as_of (set to None to keep no history)
+archive_space = py_space + r"\archive"
+
+# Render the line chart, the PDF and the bubble plot in parallel worker
+# processes, plus a chart and PDF for every agency in report_agencies
+# ('all' for every agency with open opportunities)
+parallel_reports = True
+report_agencies = []
+
+# Every run appends a record of the wall time, CPU time, peak RSS, bytes
+# read/written and rows of each stage to run_log (JSON lines). Set
+# profile_space to also save a cProfile per stage, and trace_memory to
+# record the top Python allocations per stage (slow).
+run_log = py_space + r"\runs.jsonl"
+profile_space = None
+trace_memory = False
+
 #User defined functions
-from download_and_clean_raw_data import global_variables, download, clean_df, create_line_chart, create_pdf
+from download_and_clean_raw_data import global_variables, download, download_stream, clean_df
+from snapshot_cache import load_snapshot, save_snapshot, evict_snapshots
+from incremental import apply_extract, load_delta
+from opportunity_store import update_store
+from aggregates import refresh_cube
+from history_archive import archive_extract
+from downloader import extract_url, fetch_extract
+from instrumentation import RunRecorder
 
 df_clean = None
+extract_date = None
 #%%
 
 def main():
+    with RunRecorder(run_log, profile_dir=profile_space, trace_memory=trace_memory) as run:
+        run_pipeline(run)
+
+
+def run_pipeline(run):
     # Get the global variables
     url, today_date = global_variables()
-    global df_clean
-    df = download(url=url, py_space=py_space, download_space=download_space, today_date=today_date)
-    if df_clean is None:
-        df_clean = clean_df(df)
-    else:
+    global df_clean, extract_date
+    delta = None
+    if df_clean is not None and extract_date == today_date:
         print('clean_df already exists')
+    else:
+        extract_date = today_date
+        with run.stage('load_snapshot') as stage:
+            df_clean = load_snapshot(cache_space, today_date)
+            stage['rows'] = None if df_clean is None else len(df_clean)
 
-    create_line_chart(df_clean, today_date)
+    if df_clean is None:
+        # Download (or revalidate) the newest available extract; the cached
+        # data is keyed by the date of the extract actually used
+        with run.stage('fetch_extract'):
+            zip_path, extract_date = fetch_extract(download_space, today_date, fallback_days=fallback_days,
+                                                   base_url=base_url)
+        if zip_path is None:
+            print(f'No extract was published in the last {fallback_days + 1} days')
+            return
+        df_clean = load_snapshot(cache_space, extract_date)
+    run.record['extract_date'] = extract_date
 
-    create_pdf(df_clean, today_date)
+    if df_clean is None:
+        url = extract_url(extract_date, base_url)
+        with run.stage('xml_to_df') as stage:
+            if stream_zip:
+                df = download_stream(url=url, today_date=extract_date, download_space=download_space)
+            else:
+                df = download(url=url, py_space=py_space, download_space=download_space, today_date=extract_date)
+            stage['rows'] = len(df)
+        with run.stage('clean_df') as stage:
+            if incremental:
+                df_clean, delta = apply_extract(df, store_space, extract_date)
+                stage['changes'] = len(df_clean) if delta is None else len(delta)
+            else:
+                df_clean = clean_df(df)
+            stage['rows'] = len(df_clean)
+        with run.stage('save_snapshot') as stage:
+            save_snapshot(df_clean, cache_space, extract_date)
+            evict_snapshots(cache_space, keep_days=snapshot_keep_days)
+            stage['rows'] = len(df_clean)
+    elif incremental:
+        # A run that crashed after the snapshot left the stores behind
+        delta = load_delta(store_space, extract_date)
+
+    # Both are no-ops when they are already at this extract
+    with run.stage('update_store') as stage:
+        update_store(store_db, df_clean, extract_date, delta)
+        stage['rows'] = len(df_clean) if delta is None else len(delta)
+    if archive_space:
+        with run.stage('archive_extract') as stage:
+            stage['rows'] = archive_extract(archive_space, df_clean, extract_date, delta)
+
+    # The reports read their totals from the aggregate cube in store_space
+    with run.stage('refresh_cube') as stage:
+        cube = refresh_cube(store_space, df_clean, extract_date, delta)
+        stage['rows'] = len(cube)
+
+    # matplotlib, reportlab and plotly are only loaded once there is
+    # something to render
+    if parallel_reports:
+        from report_pipeline import render_reports
+        with run.stage('render_reports') as stage:
+            render_reports(df_clean, cube, today_date, agencies=report_agencies)
+            stage['rows'] = len(df_clean)
+    else:
+        from reports import create_line_chart, create_pdf
+        with run.stage('create_line_chart') as stage:
+            create_line_chart(df_clean, today_date, cube=cube)
+            stage['rows'] = len(cube)
+
+        with run.stage('create_pdf') as stage:
+            create_pdf(df_clean, today_date, cube=cube)
+            stage['rows'] = len(cube)
 
 if __name__ == "__main__":
     main()
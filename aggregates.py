@@ -0,0 +1,140 @@
+'''
+Materialized funding rollups for the reports.
+
+The cube holds, per AgencyName x close Month x CategoryOfFundingActivity x
+FundingInstrumentType, the summed EstimatedTotalProgramFunding, the summed
+ExpectedNumberOfAwards and the number of opportunities. It is computed once
+per extract (or patched with the day's delta from incremental.apply_extract)
+and the reports read their totals from it, so their cost no longer grows
+with the number of opportunities in the extract.
+
+Cells of the extract's own month are further split by CloseDate, so
+"still open on this date" totals stay exact; every other cell has a
+missing CloseDate.
+'''
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+import download_and_clean_raw_data
+import snapshot_cache
+from incremental import applies_to
+
+DIMENSIONS = ['AgencyName', 'Month', 'CloseDate', 'CategoryOfFundingActivity', 'FundingInstrumentType']
+MEASURES = ['EstimatedTotalProgramFunding', 'ExpectedNumberOfAwards', 'OpportunityCount']
+
+
+def build_cube(df_clean, today=None):
+    month = df_clean['CloseDate'].dt.to_period('M')
+    current_month = pd.Period(today or datetime.today(), freq='M')
+    grouped = (df_clean
+               .assign(Month = month,
+                       CloseDate = lambda x: x.CloseDate.where(month == current_month))
+               .groupby(DIMENSIONS, observed=True, dropna=False))
+    return grouped.agg(EstimatedTotalProgramFunding=('EstimatedTotalProgramFunding', 'sum'),
+                       ExpectedNumberOfAwards=('ExpectedNumberOfAwards', 'sum'),
+                       OpportunityCount=('OpportunityID', 'size')).reset_index()
+
+
+def update_cube(cube, delta, today=None):
+    # Add the rows an incremental delta inserted or updated, subtract the
+    # rows it removed or replaced, and drop cells that end up empty
+    added = build_cube(delta[delta['ChangeType'].isin(['insert', 'update'])], today)
+    dropped = build_cube(delta[delta['ChangeType'].isin(['remove', 'replaced'])], today)
+    dropped[MEASURES] = -dropped[MEASURES]
+
+    combined = download_and_clean_raw_data.concat_clean([cube, added, dropped])
+    cube = (combined
+            .groupby(DIMENSIONS, observed=True, dropna=False)[MEASURES]
+            .sum()
+            .reset_index())
+    return cube[cube['OpportunityCount'] > 0].reset_index(drop=True)
+
+
+def cube_paths(cube_space):
+    return (os.path.join(cube_space, 'GrantsDBCube.arrow'),
+            os.path.join(cube_space, 'GrantsDBCube.json'))
+
+
+def load_cube(cube_space):
+    # Returns (cube, extract date), or (None, None) when there is no cube
+    # for the current clean_df
+    cube_file, meta_file = cube_paths(cube_space)
+    if not os.path.exists(cube_file) or not os.path.exists(meta_file):
+        return None, None
+
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get('fingerprint') != snapshot_cache.clean_df_fingerprint():
+        return None, None
+    return snapshot_cache.read_frame(cube_file), meta['extract_date']
+
+
+def save_cube(cube, cube_space, today_date):
+    os.makedirs(cube_space, exist_ok=True)
+    cube_file, meta_file = cube_paths(cube_space)
+    snapshot_cache.write_frame(cube, cube_file)
+    snapshot_cache.write_json({'extract_date': today_date, 'fingerprint': snapshot_cache.clean_df_fingerprint()},
+                              meta_file)
+
+
+def refresh_cube(cube_space, df_clean, today_date, delta=None):
+    # Same rules as opportunity_store.update_store: patch the stored cube
+    # when the delta was computed against the extract the cube is at,
+    # otherwise rebuild it. A new month always rebuilds, since the cells
+    # split by CloseDate move with it.
+    cube, cube_date = load_cube(cube_space)
+    if cube_date == today_date:
+        print('Aggregate cube is already up to date')
+        return cube
+
+    same_month = cube_date is not None and cube_date[:6] == today_date[:6]
+    if same_month and applies_to(delta, cube_date):
+        print('Updating the aggregate cube')
+        cube = update_cube(cube, delta, today_date)
+    else:
+        print('Building the aggregate cube')
+        cube = build_cube(df_clean, today_date)
+    save_cube(cube, cube_space, today_date)
+    return cube
+
+
+def open_cells(cube, today=None):
+    # Cells of opportunities that close on or after today. If the cube was
+    # built in an earlier month, the current month is not split by day and
+    # counts as open as a whole.
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    current_month = pd.Period(today, freq='M')
+    in_month = cube['Month'] == current_month
+    open_in_month = in_month & (cube['CloseDate'].isna() | (cube['CloseDate'] >= today))
+    return cube[(cube['Month'] > current_month) | open_in_month]
+
+
+def agency_totals(cube, today=None):
+    # Cube version of download_and_clean_raw_data.agencies(), except that
+    # opportunities closing today count as open: agencies() compares
+    # CloseDate with the current time of day, so it drops them
+    totals = (open_cells(cube, today)
+              .groupby('AgencyName', observed=True)[['EstimatedTotalProgramFunding']]
+              .sum()
+              .sort_values(by='EstimatedTotalProgramFunding', ascending=False)
+              .reset_index()
+              .assign(in_MM = lambda x: x.EstimatedTotalProgramFunding/1000000))
+    return totals[totals['EstimatedTotalProgramFunding'] > 0]
+
+
+def monthly_funding(cube, months, agency_name=None):
+    # Funding per close month for the given months (a PeriodIndex);
+    # months without any opportunity are left out, as in a groupby
+    cells = cube[cube['Month'].isin(months)]
+    if agency_name is not None:
+        cells = cells[cells['AgencyName'] == agency_name]
+    return cells.groupby('Month')['EstimatedTotalProgramFunding'].sum()
+
+
+def top_agencies(cube, n=20):
+    # Agencies with the most EstimatedTotalProgramFunding over the whole extract
+    totals = cube.groupby('AgencyName', observed=True)['EstimatedTotalProgramFunding'].sum()
+    return totals.nlargest(n).index
@@ -0,0 +1,135 @@
+'''
+Backfill a range of grants.gov extracts, e.g. after an outage.
+
+The GrantsDBExtract{date}v2.zip of every date in the range is downloaded
+concurrently: an asyncio loop runs up to `concurrency` downloader.fetch calls
+at a time on worker threads, all through one session pooling `concurrency`
+connections, so connections are reused and partial downloads resume as
+usual. As soon as a zip is complete it is parsed and cleaned in a process
+pool while the other downloads continue, and the cleaned frame is saved as
+that date's snapshot (snapshot_cache). With an archive_space the dates are
+then appended to the history archive, in date order.
+
+    python backfill.py 20260901 20260930 --download-space dl --cache-space cache --archive-space archive
+'''
+import argparse
+import asyncio
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import downloader
+import history_archive
+import snapshot_cache
+from download_and_clean_raw_data import clean_df, xml_to_df
+
+
+def date_range(start_date, end_date):
+    # 'YYYYMMDD' dates from start_date to end_date, both included
+    day = datetime.strptime(start_date, '%Y%m%d')
+    end = datetime.strptime(end_date, '%Y%m%d')
+    dates = []
+    while day <= end:
+        dates.append(day.strftime('%Y%m%d'))
+        day += timedelta(days=1)
+    return dates
+
+
+def clean_extract(zip_path, extract_date, cache_space):
+    # Runs in a worker process: parse and clean one zip into its snapshot.
+    # Only the snapshot path goes back, never the frame itself.
+    path = snapshot_cache.snapshot_path(cache_space, extract_date)
+    if not os.path.exists(path):
+        with zipfile.ZipFile(zip_path) as z, z.open(f"GrantsDBExtract{extract_date}v2.xml") as xml_file:
+            df_clean = clean_df(xml_to_df(xml_file))
+        snapshot_cache.save_snapshot(df_clean, cache_space, extract_date)
+    return path
+
+
+async def backfill_async(dates, download_space, cache_space, archive_space=None, concurrency=4,
+                         workers=None, base_url=None):
+    loop = asyncio.get_running_loop()
+    # Its own session: the shared one may already exist with a smaller pool
+    session = downloader.new_session(pool_size=concurrency)
+    limit = asyncio.Semaphore(concurrency)
+    os.makedirs(download_space, exist_ok=True)
+    os.makedirs(cache_space, exist_ok=True)
+
+    async def fetch(date):
+        zip_path = os.path.join(download_space, f"GrantsDBExtract{date}v2.zip")
+        async with limit:
+            status = await asyncio.to_thread(downloader.fetch, downloader.extract_url(date, base_url),
+                                             zip_path, session)
+        if status == 'missing' and not downloader.is_complete(zip_path):
+            return None
+        return zip_path
+
+    async def process(date, pool):
+        zip_path = await fetch(date)
+        if zip_path is None:
+            return None
+        return await loop.run_in_executor(pool, clean_extract, zip_path, date, cache_space)
+
+    archived = history_archive.archived_dates(archive_space) if archive_space else []
+    # The previously archived (date, frame), so each date is compared with
+    # it instead of the archive being replayed
+    previous = None
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool, session:
+        tasks = {date: asyncio.create_task(process(date, pool)) for date in dates}
+
+        # Waiting in date order lets each date be archived as soon as it and
+        # every date before it are done, while later ones keep going
+        for date in dates:
+            try:
+                path = await tasks[date]
+            except Exception as error:
+                print(f'{date}: failed ({error!r})')
+                results[date] = 'failed'
+                continue
+            if path is None:
+                print(f'{date}: no extract published')
+                results[date] = 'missing'
+                continue
+
+            results[date] = 'cleaned'
+            if archive_space and (not archived or date > archived[-1]):
+                df_clean = await asyncio.to_thread(snapshot_cache.read_frame, path)
+                await asyncio.to_thread(history_archive.archive_extract, archive_space, df_clean, date,
+                                        previous=previous)
+                previous = (date, df_clean)
+                results[date] = 'archived'
+            print(f'{date}: {results[date]}')
+    return results
+
+
+def backfill(start_date, end_date, download_space, cache_space, archive_space=None, concurrency=4,
+             workers=None, base_url=None):
+    # Returns {date: 'archived', 'cleaned', 'missing' or 'failed'}. Dates the
+    # archive already goes past are cleaned but not archived.
+    dates = date_range(start_date, end_date)
+    return asyncio.run(backfill_async(dates, download_space, cache_space, archive_space,
+                                      concurrency, workers, base_url))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('start_date', help='first extract date, YYYYMMDD')
+    parser.add_argument('end_date', help='last extract date, YYYYMMDD')
+    parser.add_argument('--download-space', required=True)
+    parser.add_argument('--cache-space', required=True)
+    parser.add_argument('--archive-space')
+    parser.add_argument('--concurrency', type=int, default=4, help='downloads at a time')
+    parser.add_argument('--workers', type=int, help='parse/clean processes (default: CPU count)')
+    parser.add_argument('--base-url', help='where the extracts are published (default: grants.gov)')
+    args = parser.parse_args()
+
+    results = backfill(args.start_date, args.end_date, args.download_space, args.cache_space,
+                       args.archive_space, args.concurrency, args.workers, args.base_url)
+    counts = {status: list(results.values()).count(status) for status in dict.fromkeys(results.values())}
+    print(', '.join(f'{count} {status}' for status, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Compare the schema-driven clean_df with the original chained-assign version.
+
+Builds a synthetic raw extract (the frame xml_to_df returns for a
+synthetic_extract.py extract) and reports wall time and peak traced memory
+for both.
+
+    python benchmarks/bench_clean_df.py --rows 100000
+'''
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from download_and_clean_raw_data import clean_df
+
+from synthetic_extract import synthetic_raw_df
+
+
+def legacy_clean_df(df):
+    # clean_df as it was before COLUMN_SCHEMA, kept as the baseline
+    col = df.columns
+
+    df_clean = (df[col]
+                .assign(CloseDate = lambda x: pd.to_datetime(x['CloseDate'], format='%m%d%Y'),
+                        PostDate = lambda x: pd.to_datetime(x['PostDate'], format='%m%d%Y'),
+                        LastUpdatedDate = lambda x: pd.to_datetime(x['PostDate'], format='%m%d%Y'),
+                        AwardCeiling = lambda x: pd.to_numeric(x['AwardCeiling'], errors='coerce'),
+                        AwardFloor = lambda x: x.AwardFloor.astype(float).astype('Int32'),
+                        EstimatedTotalProgramFunding = lambda x: x.EstimatedTotalProgramFunding.astype(float).astype('Int64'),
+                        OpportunityCategory = lambda x: x.OpportunityCategory.astype(str).astype('category'),
+                        FundingInstrumentType = lambda x: x.FundingInstrumentType.astype(str).astype('category'),
+                        CategoryOfFundingActivity = lambda x: x.CategoryOfFundingActivity.astype(str).astype('category'),
+                        CategoryExplanation = lambda x: x.CategoryExplanation.astype(str).astype('category'),
+                        EligibleApplicants = lambda x: x.EligibleApplicants.astype(str).astype('category'),
+                        AdditionalInformationOnEligibility = lambda x: x.AdditionalInformationOnEligibility.astype(str),
+                        AgencyCode = lambda x: x.AgencyCode.astype(str).astype('category'),
+                        AgencyName = lambda x: x.AgencyName.astype(str).astype('category'),
+                        ExpectedNumberOfAwards = lambda x: x.ExpectedNumberOfAwards.astype(float).astype('Int32'),
+                        Version = lambda x: x.Version.astype(str).astype('category'),
+                        CostSharingOrMatchingRequirement = lambda x: x.CostSharingOrMatchingRequirement.astype(str).astype('category')
+                        ))
+    return df_clean
+
+
+def measure(func, df, repeat):
+    # Best wall time over repeat runs, then one extra run under tracemalloc
+    # for the peak (tracing slows pandas down too much to time it as well)
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        elapsed.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(elapsed), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_raw_df(args.rows)
+    print(f'{args.rows:,} rows, best of {args.repeat}')
+    for label, func in (('legacy clean_df', legacy_clean_df), ('clean_df', clean_df)):
+        elapsed, peak = measure(func, df, args.repeat)
+        print(f'{label:<16} {elapsed:8.3f} s  {peak / 1e6:8.1f} MB peak')
+
+
+if __name__ == '__main__':
+    main()
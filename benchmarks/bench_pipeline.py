@@ -0,0 +1,149 @@
+'''
+Benchmark the pipeline stages on synthetic extracts.
+
+For every size, writes a synthetic GrantsDBExtract zip (see
+synthetic_extract.py) to a temporary directory and reports the best wall time
+and the peak traced memory of xml_to_df, clean_df, agencies,
+create_line_chart and create_pdf. No network access is needed.
+
+It also times the imports of a fresh interpreter (rows 0): the ingest
+modules, ETL_Grants_dot_gov_V2 and each grants_cli.py command, which must not
+load the reporting libraries before they are needed.
+
+Every run is appended as one JSON line to --results (with the git commit and
+library versions), and each stage is compared with the previous recorded run
+of the same size, so regressions show up as the code changes.
+
+    python benchmarks/bench_pipeline.py --rows 10000 100000 1000000
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+from download_and_clean_raw_data import agencies, clean_df, xml_to_df
+from reports import create_line_chart, create_pdf
+
+from bench_clean_df import measure
+from synthetic_extract import write_extract
+
+RESULTS_FILE = os.path.join(BENCH_DIR, 'results.jsonl')
+REPO_DIR = os.path.join(BENCH_DIR, '..')
+
+# Imports of the entry points, each timed in a new interpreter
+IMPORTS = [
+    ('python', 'pass'),
+    ('downloader', 'import downloader'),
+    ('download_and_clean_raw_data', 'import download_and_clean_raw_data'),
+    ('etl_script', 'import ETL_Grants_dot_gov_V2'),
+    ('cli_fetch', 'import grants_cli, downloader'),
+    ('cli_clean', 'import grants_cli, downloader, snapshot_cache, incremental, opportunity_store, '
+                  'history_archive, aggregates'),
+    ('cli_report', 'import grants_cli, snapshot_cache, aggregates, report_pipeline'),
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(results_file):
+    # Latest recorded {(rows, stage): seconds}
+    previous = {}
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            for line in f:
+                record = json.loads(line)
+                for result in record['results']:
+                    previous[result['rows'], result['stage']] = result['seconds']
+    return previous
+
+
+def bench_size(rows, extract_date, work_dir, repeat):
+    zip_path = write_extract(work_dir, extract_date, rows)
+    xml_path = os.path.join(work_dir, f'GrantsDBExtract{extract_date}v2.xml')
+    with zipfile.ZipFile(zip_path) as zf:
+        zf.extractall(work_dir)
+
+    df = xml_to_df(xml_path)
+    df_clean = clean_df(df)
+    chart_file = os.path.join(work_dir, 'line_chart.png')
+    stages = [
+        ('xml_to_df', lambda: xml_to_df(xml_path)),
+        ('clean_df', lambda: clean_df(df)),
+        ('agencies', lambda: agencies(df_clean)),
+        ('create_line_chart', lambda: create_line_chart(df_clean, extract_date, filename=chart_file)),
+        ('create_pdf', lambda: create_pdf(df_clean, extract_date, chart_file=chart_file,
+                                          filename=os.path.join(work_dir, 'Current_Opportunities.pdf'))),
+    ]
+    results = []
+    for stage, func in stages:
+        seconds, peak = measure(lambda _: func(), None, repeat)
+        results.append({'rows': rows, 'stage': stage, 'seconds': round(seconds, 4), 'peak_bytes': peak})
+    return results
+
+
+def bench_imports(repeat):
+    results = []
+    for name, statement in IMPORTS:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', statement], cwd=REPO_DIR, check=True)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        results.append({'rows': 0, 'stage': f'import:{name}', 'seconds': round(best, 4), 'peak_bytes': None})
+    return results
+
+
+def print_result(result, before):
+    change = f'{result["seconds"] / before - 1:+7.1%}' if before else ''
+    peak = '' if result['peak_bytes'] is None else f'{result["peak_bytes"] / 1e6:8.1f} MB peak'
+    print(f'  {result["stage"]:<36} {result["seconds"]:8.3f} s  {peak:<16}  {change}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--date', default=datetime.today().strftime('%Y%m%d'),
+                        help='extract date of the synthetic extracts (YYYYMMDD)')
+    parser.add_argument('--results', default=RESULTS_FILE, help='JSON lines file the run is appended to')
+    args = parser.parse_args()
+
+    previous = previous_results(args.results)
+    results = []
+    print(f'Imports, best of {args.repeat}')
+    for result in bench_imports(args.repeat):
+        print_result(result, previous.get((0, result['stage'])))
+        results.append(result)
+
+    for rows in args.rows:
+        print(f'{rows:,} rows, best of {args.repeat}')
+        with tempfile.TemporaryDirectory() as work_dir:
+            for result in bench_size(rows, args.date, work_dir, args.repeat):
+                print_result(result, previous.get((rows, result['stage'])))
+                results.append(result)
+
+    record = {'date': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+              'python': platform.python_version(), 'pandas': pd.__version__, 'results': results}
+    with open(args.results, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
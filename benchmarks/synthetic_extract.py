@@ -0,0 +1,187 @@
+'''
+Synthetic GrantsDBExtract files for offline tests and benchmarks.
+
+Writes GrantsDBExtract{date}v2.zip files shaped like the grants.gov extract:
+one XML document in the OpportunityDetail-V1.0 namespace holding
+OpportunitySynopsisDetail_1_0 records with the fields clean_df expects, plus
+a share of OpportunityForecastDetail_1_0 records (which xml_to_df skips, as
+in the real file). Optional fields are left out of some records,
+EligibleApplicants and CFDANumbers are repeated in some records (one element
+per value, as in the real file), dates are spread around the extract date and
+the long text fields have realistic lengths. The same seed always gives the
+same extract.
+
+    python benchmarks/synthetic_extract.py --rows 100000 --date 20261017 --out dl
+
+Point downloader.EXTRACT_BASE_URL (or base_url in ETL_Grants_dot_gov_V2,
+--base-url of grants_cli.py and backfill.py) at an HTTP server over the
+output directory to run the whole pipeline offline.
+'''
+import argparse
+import os
+import random
+import zipfile
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+NAMESPACE = 'http://apply.grants.gov/system/OpportunityDetail-V1.0'
+
+AGENCIES = [
+    ('ED', 'Department of Education'),
+    ('HHS-NIH11', 'National Institutes of Health'),
+    ('HHS-CDC', 'Centers for Disease Control and Prevention'),
+    ('HHS-HRSA', 'Health Resources and Services Administration'),
+    ('HHS-ACF', 'Administration for Children and Families'),
+    ('NSF', 'National Science Foundation'),
+    ('DOE', 'Department of Energy'),
+    ('DOE-NETL', 'National Energy Technology Laboratory'),
+    ('USDA-NIFA', 'National Institute of Food and Agriculture'),
+    ('USDA-FS', 'Forest Service'),
+    ('DOC-NOAA', 'National Oceanic and Atmospheric Administration'),
+    ('DOC-EDA', 'Economic Development Administration'),
+    ('DOI-FWS', 'Fish and Wildlife Service'),
+    ('DOI-BLM', 'Bureau of Land Management'),
+    ('DOI-NPS', 'National Park Service'),
+    ('DOJ-OJP-BJA', 'Bureau of Justice Assistance'),
+    ('DOJ-OJP-OVC', 'Office for Victims of Crime'),
+    ('DOS-DRL', 'Bureau of Democracy, Human Rights and Labor'),
+    ('DOT-FHWA', 'Federal Highway Administration'),
+    ('DOT-FTA', 'Federal Transit Administration'),
+    ('EPA', 'Environmental Protection Agency'),
+    ('HUD', 'Department of Housing and Urban Development'),
+    ('DOL-ETA', 'Employment and Training Administration'),
+    ('NASA', 'National Aeronautics and Space Administration'),
+    ('NEA', 'National Endowment for the Arts'),
+    ('NEH', 'National Endowment for the Humanities'),
+    ('IMLS', 'Institute of Museum and Library Services'),
+    ('DOD-AFRL', 'Air Force Research Laboratory'),
+    ('DOD-ONR', 'Office of Naval Research'),
+    ('USAID', 'Agency for International Development'),
+]
+# A few agencies post most of the opportunities
+AGENCY_WEIGHTS = [1 / (rank + 1) for rank in range(len(AGENCIES))]
+
+OPPORTUNITY_CATEGORIES = ['D', 'M', 'C', 'E', 'O']
+FUNDING_INSTRUMENT_TYPES = ['G', 'CA', 'O', 'PC']
+FUNDING_ACTIVITY_CATEGORIES = ['ED', 'HL', 'ST', 'AG', 'ENV', 'CD', 'ISS', 'NR', 'O', 'ACA', 'AR', 'T']
+ELIGIBLE_APPLICANTS = ['25', '99', '12', '00', '01', '06', '20', '21', '22', '23']
+WORDS = ('program research education community health support project applicants award funding '
+         'development training services federal state local tribal organizations eligible '
+         'proposals activities infrastructure science technology innovation public private '
+         'partnership capacity evaluation outcomes data rural urban youth workforce climate '
+         'resilience safety access equity families children students teachers institutions '
+         'nonprofit agreement cooperative period performance budget cost sharing').split()
+
+
+def text(rng, min_words, max_words):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(min_words, max_words))).capitalize() + '.'
+
+
+def mmddyyyy(day):
+    return day.strftime('%m%d%Y')
+
+
+def synthetic_opportunities(rows, extract_date, seed=0):
+    # Yield (record tag, {field: text}) pairs in document order; fields
+    # missing from a record are left out of its dict, and a repeated field
+    # holds the list of its values
+    rng = random.Random(seed)
+    extract_day = datetime.strptime(extract_date, '%Y%m%d')
+    for i in range(rows):
+        code, name = rng.choices(AGENCIES, weights=AGENCY_WEIGHTS)[0]
+        post = extract_day - timedelta(days=rng.randint(0, 730))
+        close = post + timedelta(days=rng.randint(30, 545))
+        updated = min(post + timedelta(days=rng.randint(0, 120)), extract_day)
+        ceiling = rng.choice([25_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000])
+
+        record = {
+            'OpportunityID': str(300000 + i),
+            'OpportunityTitle': text(rng, 4, 14),
+            'OpportunityNumber': f'{code}-{post.year % 100:02d}-{i:06d}',
+            'OpportunityCategory': rng.choice(OPPORTUNITY_CATEGORIES),
+            'FundingInstrumentType': rng.choice(FUNDING_INSTRUMENT_TYPES),
+            'CategoryOfFundingActivity': rng.choice(FUNDING_ACTIVITY_CATEGORIES),
+            'CategoryExplanation': text(rng, 3, 20) if rng.random() < 0.2 else None,
+            'CFDANumbers': [f'{rng.randint(10, 98)}.{rng.randint(1, 999):03d}'
+                            for _ in range(rng.choice([1, 1, 1, 2]))],
+            'EligibleApplicants': rng.sample(ELIGIBLE_APPLICANTS, rng.choice([1, 1, 2, 3])),
+            'AdditionalInformationOnEligibility': text(rng, 10, 120) if rng.random() < 0.7 else None,
+            'AgencyCode': code,
+            'AgencyName': name,
+            'PostDate': mmddyyyy(post),
+            'CloseDate': mmddyyyy(close) if rng.random() < 0.95 else None,
+            'LastUpdatedDate': mmddyyyy(updated),
+            'AwardCeiling': str(ceiling) if rng.random() < 0.85 else None,
+            'AwardFloor': str(rng.choice([0, 1_000, 10_000, 50_000])) if rng.random() < 0.85 else None,
+            'EstimatedTotalProgramFunding': str(ceiling * rng.randint(1, 40)) if rng.random() < 0.9 else None,
+            'ExpectedNumberOfAwards': str(rng.randint(1, 100)) if rng.random() < 0.9 else None,
+            'Description': text(rng, 40, 400),
+            'Version': f'Synopsis {rng.randint(1, 6)}',
+            'CostSharingOrMatchingRequirement': rng.choice(['Yes', 'No']),
+            'ArchiveDate': mmddyyyy(close + timedelta(days=30)) if rng.random() < 0.8 else None,
+            'GrantorContactEmail': f'grants@{code.lower()}.gov',
+            'GrantorContactText': text(rng, 5, 15),
+        }
+        yield 'OpportunitySynopsisDetail_1_0', {k: v for k, v in record.items() if v is not None}
+
+        if rng.random() < 0.1:
+            # Forecasts share the ID space but are not synopses
+            yield 'OpportunityForecastDetail_1_0', {
+                'OpportunityID': str(900000 + i),
+                'OpportunityTitle': text(rng, 4, 14),
+                'AgencyCode': code,
+                'AgencyName': name,
+                'EstimatedSynopsisPostDate': mmddyyyy(extract_day + timedelta(days=rng.randint(1, 180))),
+                'Description': text(rng, 40, 200),
+            }
+
+
+def write_extract_xml(f, rows, extract_date, seed=0):
+    # Write the XML document to the binary file f
+    f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<Grants xmlns="{NAMESPACE}">'.encode())
+    for tag, record in synthetic_opportunities(rows, extract_date, seed):
+        fields = ''.join(f'<{name}>{escape(value)}</{name}>'
+                         for name, values in record.items()
+                         for value in (values if isinstance(values, list) else [values]))
+        f.write(f'<{tag}>{fields}</{tag}>'.encode())
+    f.write(b'</Grants>\n')
+
+
+def write_extract(out_dir, extract_date, rows, seed=0):
+    # Write GrantsDBExtract{extract_date}v2.zip to out_dir and return its
+    # path. The XML is streamed into the archive, so even 1M rows never
+    # sit in memory or on disk uncompressed.
+    os.makedirs(out_dir, exist_ok=True)
+    zip_path = os.path.join(out_dir, f'GrantsDBExtract{extract_date}v2.zip')
+    with zipfile.ZipFile(zip_path + '.part', 'w', zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(f'GrantsDBExtract{extract_date}v2.xml', 'w', force_zip64=True) as f:
+            write_extract_xml(f, rows, extract_date, seed)
+    os.replace(zip_path + '.part', zip_path)
+    return zip_path
+
+
+def synthetic_raw_df(rows, extract_date='20260101', seed=0):
+    # The frame xml_to_df would return for write_extract(rows=rows), where
+    # a repeated field keeps its last value
+    records = [{name: values[-1] if isinstance(values, list) else values for name, values in record.items()}
+               for tag, record in synthetic_opportunities(rows, extract_date, seed)
+               if tag == 'OpportunitySynopsisDetail_1_0']
+    return pd.DataFrame.from_records(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--date', default=datetime.today().strftime('%Y%m%d'))
+    parser.add_argument('--out', default='.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    zip_path = write_extract(args.out, args.date, args.rows, args.seed)
+    print(f'Wrote {args.rows:,} opportunities to {zip_path} ({os.path.getsize(zip_path) / 1e6:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
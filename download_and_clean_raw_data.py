@@ -1,49 +1,231 @@
-
+from array import array
 from datetime import datetime
 import zipfile
+import operator
 import os
-import requests
+import tempfile
 import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import pandas as pd
-import matplotlib as mpl
+from pandas.api.types import union_categoricals
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from datetime import datetime
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, Image
+import downloader
 
+# The charts, PDFs and bubble plots live in reports.py, so downloading,
+# parsing and cleaning never import matplotlib, reportlab or plotly. Their
+# old names (the functions and the BUBBLE_COLUMNS constant) still work from
+# here and load reports on first use.
+REPORT_NAMES = ['draw_line_chart', 'create_line_chart', 'write_pdf', 'create_pdf', 'agency_file_name',
+                'create_agency_reports', 'BUBBLE_COLUMNS', 'bubble_points', 'draw_bubble_plot',
+                'create_bubble_plot', 'create_agency_bubble_plots']
+
+
+def __getattr__(name):
+    if name in REPORT_NAMES:
+        import reports
+        return getattr(reports, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def global_variables():
     today_date = datetime.today().strftime('%Y%m%d')
-    url = f"https://prod-grants-gov-chatbot.s3.amazonaws.com/extracts/GrantsDBExtract{today_date}v2.zip"
+    url = downloader.extract_url(today_date)
     return url, today_date
 
 
-def xml_to_df(xml_file_path):
-    # Parse the XML file
-    tree = ET.parse(xml_file_path)
-    root = tree.getroot()
-    
-    # Extracting the data from the 'OpportunitySynopsisDetail_1_0' tag
-    data = []
-    for opportunity in root.findall('{http://apply.grants.gov/system/OpportunityDetail-V1.0}OpportunitySynopsisDetail_1_0'):
+NAMESPACE = '{http://apply.grants.gov/system/OpportunityDetail-V1.0}'
+OPPORTUNITY_TAG = NAMESPACE + 'OpportunitySynopsisDetail_1_0'
+
+
+# Fields the reports (agencies, the aggregate cube, the charts and PDFs)
+# read; pass as columns= to skip the long text fields while parsing
+REPORT_COLUMNS = ['OpportunityID', 'AgencyCode', 'AgencyName', 'CloseDate', 'CategoryOfFundingActivity',
+                  'FundingInstrumentType', 'EstimatedTotalProgramFunding', 'ExpectedNumberOfAwards']
+
+FILTER_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, values: value in values,
+    'not in': lambda value, values: value not in values,
+}
+
+
+def field_parser(name):
+    # Function turning the raw text of a field into the value row filters
+    # compare, following COLUMN_SCHEMA; it returns None when the text is
+    # missing or cannot be parsed
+    dtype = COLUMN_SCHEMA.get(name)
+    if dtype == 'date':
+        parsed = {}
+
+        def parse(text):
+            # Dates repeat, so each distinct string is parsed once
+            if text not in parsed:
+                try:
+                    parsed[text] = datetime.strptime(text, DATE_FORMAT)
+                except (TypeError, ValueError):
+                    parsed[text] = None
+            return parsed[text]
+        return parse
+    if dtype in ('float', 'Int32', 'Int64'):
+        def parse(text):
+            try:
+                return float(text)
+            except (TypeError, ValueError):
+                return None
+        return parse
+    return lambda text: text
+
+
+def filter_value(name, value):
+    # Bring a filter value to the type field_parser returns for the field
+    dtype = COLUMN_SCHEMA.get(name)
+    if dtype == 'date':
+        return pd.Timestamp(value).to_pydatetime()
+    if dtype in ('float', 'Int32', 'Int64'):
+        return float(value)
+    return value
+
+
+def compile_filters(filters):
+    # filters is a list of (field, op, value) tuples that must all hold,
+    # e.g. [('CloseDate', '>=', today), ('AgencyCode', 'in', ['ED', 'NSF'])].
+    # Rows where a filtered field is missing or unparsable never match.
+    tests = []
+    for name, op, value in filters or []:
+        if op not in FILTER_OPS:
+            raise ValueError(f'Unknown filter operator {op!r}, expected one of {list(FILTER_OPS)}')
+        if op in ('in', 'not in'):
+            value = {filter_value(name, v) for v in value}
+        else:
+            value = filter_value(name, value)
+        tests.append((name, field_parser(name), FILTER_OPS[op], value))
+    return tests
+
+
+def matches(record, tests):
+    for name, parse, op, target in tests:
+        value = parse(record.get(name))
+        if value is None or not op(value, target):
+            return False
+    return True
+
+
+def encoded_categorical(codes, vocabulary):
+    # Build a categorical from parse-time codes (an array of ints, -1 for
+    # missing) and the vocabulary {text: code} they index. The categories
+    # are sorted, as pd.Categorical would infer them from the strings.
+    categories = np.array(list(vocabulary), dtype=object)
+    order = np.argsort(categories)
+    remap = np.empty(len(categories) + 1, dtype=np.int32)
+    remap[order] = np.arange(len(categories), dtype=np.int32)
+    remap[-1] = -1
+    codes = remap[np.frombuffer(codes, dtype=np.intc)]
+    return pd.Categorical.from_codes(codes, categories=categories[order])
+
+
+def iter_xml_batches(xml_source, batch_size=50000, columns=None, filters=None):
+    # Stream the XML instead of building the whole tree in memory.
+    # xml_source can be a file path or any binary file-like object.
+    # Each column is written straight into its own buffer, and every
+    # opportunity element is cleared as soon as it has been consumed.
+    #
+    # columns limits the fields that are kept (in that order); the text of
+    # every other field is dropped with its element instead of being stored.
+    # filters (see compile_filters) are checked on each opportunity before
+    # any of its fields is stored, so rejected rows cost nothing either.
+    #
+    # The 'category' fields of COLUMN_SCHEMA are dictionary-encoded as they
+    # are read: their buffers hold integer codes into one vocabulary per
+    # field, shared by all batches, and come out as categoricals. Later
+    # batches can have more categories than earlier ones (see concat_clean).
+    tests = compile_filters(filters)
+    wanted = None
+    if columns is not None:
+        wanted = {NAMESPACE + name for name in columns}
+        wanted.update(NAMESPACE + name for name, _, _, _ in tests)
+
+    vocabularies = {name: {} for name, dtype in COLUMN_SCHEMA.items() if dtype == 'category'}
+
+    def new_buffer(name, n_rows):
+        # A field seen for the first time is back-filled as missing
+        if name in vocabularies:
+            return array('i', [-1]) * n_rows
+        return [None] * n_rows
+
+    def batch_frame(buffers):
+        return pd.DataFrame({name: encoded_categorical(buffer, vocabularies[name])
+                             if name in vocabularies else buffer
+                             for name, buffer in buffers.items()})
+
+    buffers = {} if columns is None else {name: new_buffer(name, 0) for name in columns}
+    n_rows = 0
+
+    context = ET.iterparse(xml_source, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag != OPPORTUNITY_TAG:
+            continue
+
         record = {}
-        for child in opportunity:
-            record[child.tag.split('}')[-1]] = child.text
-        data.append(record)
-    
-    # Convert the list of dictionaries into a pandas DataFrame
-    df = pd.DataFrame(data)
-    
+        for child in elem:
+            if wanted is None or child.tag in wanted:
+                record[child.tag.split('}')[-1]] = child.text
+
+        # Drop the consumed element (and its siblings) from the root
+        elem.clear()
+        root.clear()
+
+        if tests and not matches(record, tests):
+            continue
+
+        for name, text in record.items():
+            buffer = buffers.get(name)
+            if buffer is None:
+                if columns is not None:
+                    # A field only read for a filter
+                    continue
+                buffer = buffers[name] = new_buffer(name, n_rows)
+            vocabulary = vocabularies.get(name)
+            if vocabulary is not None:
+                code = vocabulary.get(text, -1)
+                if code == -1 and text is not None:
+                    code = vocabulary[text] = len(vocabulary)
+                buffer.append(code)
+            else:
+                buffer.append(text)
+        n_rows += 1
+
+        # Pad the fields this opportunity did not have
+        for name, buffer in buffers.items():
+            if len(buffer) < n_rows:
+                buffer.append(-1 if name in vocabularies else None)
+
+        if batch_size and n_rows >= batch_size:
+            yield batch_frame(buffers)
+            buffers = {name: new_buffer(name, 0) for name in buffers}
+            n_rows = 0
+
+    if n_rows or not batch_size:
+        yield batch_frame(buffers)
+
+
+def xml_to_df(xml_file_path, chunksize=None, columns=None, filters=None):
+    # With chunksize, return a generator of DataFrames of chunksize records
+    # (like pandas.read_csv); otherwise return the whole extract at once.
+    # columns and filters are applied while parsing (see iter_xml_batches).
+    if chunksize:
+        return iter_xml_batches(xml_file_path, batch_size=chunksize, columns=columns, filters=filters)
+
+    df = next(iter_xml_batches(xml_file_path, batch_size=None, columns=columns, filters=filters))
+
     return df
 
-def download(url, py_space, download_space, today_date):
+def download(url, py_space, download_space, today_date, columns=None, filters=None):
     xml_file_name = f"GrantsDBExtract{today_date}v2.xml"
     xml_file_path = os.path.join(py_space, xml_file_name)
 
@@ -51,13 +233,11 @@ def download(url, py_space, download_space, today_date):
     download_file_path = os.path.join(download_space, zip_file_name)
     zip_path = download_file_path
 
-    # Check if the zip file exists
-    if not os.path.exists(download_file_path):
+    # Check if the zip file was completely downloaded (a partial download
+    # is resumed)
+    if not downloader.is_complete(download_file_path):
         print('Downloading zip file')
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open(zip_path, 'wb') as f:
-                f.write(response.content)
+        if downloader.fetch(url, zip_path) == 'downloaded':
             with zipfile.ZipFile(zip_path, 'r') as z:
                 z.extract(xml_file_name, py_space)
     else:
@@ -76,35 +256,167 @@ def download(url, py_space, download_space, today_date):
         print('XML file already exists')
 
     # Now use your provided function to read the XML into a DataFrame
-    df = xml_to_df(xml_file_path)
+    df = xml_to_df(xml_file_path, columns=columns, filters=filters)
     return df
 
 
-def clean_df(df):
-    col = df.columns
-
-    df_clean = (df[col]
-                #convert CloseDate to date from MMDDYYYY
-                .assign(CloseDate = lambda x: pd.to_datetime(x['CloseDate'], format='%m%d%Y'),
-                        PostDate = lambda x: pd.to_datetime(x['PostDate'], format='%m%d%Y'),
-                        LastUpdatedDate = lambda x: pd.to_datetime(x['PostDate'], format='%m%d%Y'),
-                        AwardCeiling = lambda x: pd.to_numeric(x['AwardCeiling'], errors='coerce'),
-                        AwardFloor = lambda x: x.AwardFloor.astype(float).astype('Int32'),
-                        EstimatedTotalProgramFunding = lambda x: x.EstimatedTotalProgramFunding.astype(float).astype('Int64'),
-                        OpportunityCategory = lambda x: x.OpportunityCategory.astype(str).astype('category'),
-                        FundingInstrumentType = lambda x: x.FundingInstrumentType.astype(str).astype('category'),
-                        CategoryOfFundingActivity = lambda x: x.CategoryOfFundingActivity.astype(str).astype('category'),
-                        CategoryExplanation = lambda x: x.CategoryExplanation.astype(str).astype('category'),
-                        EligibleApplicants = lambda x: x.EligibleApplicants.astype(str).astype('category'),
-                        AdditionalInformationOnEligibility = lambda x: x.AdditionalInformationOnEligibility.astype(str),
-                        AgencyCode = lambda x: x.AgencyCode.astype(str).astype('category'),
-                        AgencyName = lambda x: x.AgencyName.astype(str).astype('category'),
-                        ExpectedNumberOfAwards = lambda x: x.ExpectedNumberOfAwards.astype(float).astype('Int32'),
-                        Version = lambda x: x.Version.astype(str).astype('category'),
-                        CostSharingOrMatchingRequirement = lambda x: x.CostSharingOrMatchingRequirement.astype(str).astype('category')     
-                        ))          
+def download_stream(url, today_date, download_space=None, chunk_size=1024 * 1024, columns=None, filters=None):
+    # Read the XML straight out of the zip without extracting it to disk.
+    # The response body is streamed in chunks; the zip is only kept in
+    # download_space when one is given (as a cache for later runs),
+    # otherwise it is spooled to a temporary file that is removed on close.
+    xml_file_name = f"GrantsDBExtract{today_date}v2.xml"
+    zip_file_name = f"GrantsDBExtract{today_date}v2.zip"
+    zip_path = os.path.join(download_space, zip_file_name) if download_space else None
+
+    if zip_path:
+        # The cached zip goes through the resumable, verified downloader
+        if downloader.is_complete(zip_path):
+            print('Zip file was already downloaded for today')
+        elif downloader.fetch(url, zip_path) == 'missing':
+            print("Zip file not found.")
+            return None
+        archive = open(zip_path, 'rb')
+    else:
+        print('Streaming zip file')
+        response = downloader.get_session().get(url, stream=True, timeout=downloader.TIMEOUT)
+        if response.status_code != 200:
+            print(f"Failed to download file. HTTP Status Code: {response.status_code}")
+            return None
+        # ZipFile needs to seek to the central directory at the end of the
+        # archive, so the body has to land somewhere seekable first
+        archive = tempfile.TemporaryFile()
+        with response:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                archive.write(chunk)
+        archive.seek(0)
+
+    # Feed the zip member stream directly into the XML parser
+    with archive, zipfile.ZipFile(archive, 'r') as z, z.open(xml_file_name) as xml_file:
+        df = xml_to_df(xml_file, columns=columns, filters=filters)
+    return df
+
+
+# Target dtype of every grants.gov field that clean_df converts.
+# Fields that are not listed here are passed through unchanged.
+#   date     - MMDDYYYY string to datetime64
+#   float    - numeric, unparsable values become NaN
+#   Int32/64 - nullable integer, unparsable or out-of-range values become <NA>
+#   category - pandas categorical, missing values stay missing
+#   str      - text, left as it is
+DATE_FORMAT = '%m%d%Y'
+COLUMN_SCHEMA = {
+    'CloseDate': 'date',
+    'PostDate': 'date',
+    'LastUpdatedDate': 'date',
+    'AwardCeiling': 'float',
+    'AwardFloor': 'Int32',
+    'EstimatedTotalProgramFunding': 'Int64',
+    'ExpectedNumberOfAwards': 'Int32',
+    'OpportunityCategory': 'category',
+    'FundingInstrumentType': 'category',
+    'CategoryOfFundingActivity': 'category',
+    'CategoryExplanation': 'category',
+    'EligibleApplicants': 'category',
+    'AgencyCode': 'category',
+    'AgencyName': 'category',
+    'Version': 'category',
+    'CostSharingOrMatchingRequirement': 'category',
+    'AdditionalInformationOnEligibility': 'str',
+}
+
+
+def to_float(values):
+    # The plain cast is several times faster than to_numeric, so only fall
+    # back to element-wise parsing when a column has unparsable values
+    try:
+        return values.astype('float64')
+    except (TypeError, ValueError):
+        return pd.to_numeric(values, errors='coerce').astype('float64')
+
+
+def convert_column(values, dtype):
+    # Convert one raw column to its schema dtype in a single step
+    if dtype == 'date':
+        # An extract repeats the same few thousand dates, so each distinct
+        # string is parsed once and broadcast back through its codes
+        codes, uniques = pd.factorize(values)
+        dates = pd.to_datetime(uniques, format=DATE_FORMAT, errors='coerce')
+        dates = dates.take(codes, allow_fill=True, fill_value=pd.NaT)
+        return pd.Series(dates, index=values.index, name=values.name)
+    if dtype == 'float':
+        return to_float(values)
+    if dtype in ('Int32', 'Int64'):
+        numbers = to_float(values)
+        limits = np.iinfo(dtype.lower())
+        invalid = (numbers % 1 != 0) | (numbers < limits.min) | (numbers > limits.max)
+        return numbers.mask(invalid).astype(dtype)
+    if dtype == 'category':
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Already encoded by the parser; only drop the categories of
+            # the shared vocabulary that these rows do not use
+            return values.cat.remove_unused_categories()
+        return pd.Series(pd.Categorical(values), index=values.index, name=values.name)
+    if dtype == 'str':
+        return values
+    raise ValueError(f'Unknown dtype {dtype!r} in COLUMN_SCHEMA')
+
+
+def clean_df(df, errors='report'):
+    # Apply COLUMN_SCHEMA to every column in one pass and build the cleaned
+    # frame once at the end, instead of copying the frame per conversion.
+    # Values that cannot be converted become missing. errors='report' prints
+    # the count per column (also kept in df_clean.attrs['coercion_errors']),
+    # errors='raise' raises a ValueError naming every column that failed.
+    cleaned = {}
+    coercion_errors = {}
+    for col in df.columns:
+        values = df[col]
+        dtype = COLUMN_SCHEMA.get(col)
+        if dtype is None:
+            cleaned[col] = values
+            continue
+
+        converted = convert_column(values, dtype)
+        failed = int((converted.isna() & values.notna()).sum())
+        if failed:
+            coercion_errors[col] = failed
+        cleaned[col] = converted
+
+    if coercion_errors:
+        message = ', '.join(f'{failed} in {col}' for col, failed in coercion_errors.items())
+        if errors == 'raise':
+            raise ValueError(f'Values could not be converted: {message}')
+        print(f'Values could not be converted and were set to missing: {message}')
+
+    df_clean = pd.DataFrame(cleaned, index=df.index, copy=False)
+    df_clean.attrs['coercion_errors'] = coercion_errors
     return df_clean
-    
+
+
+def concat_clean(frames):
+    # pd.concat turns categoricals with different categories into object
+    # columns, so align every categorical column on the union of its
+    # categories first (sorted, as clean_df infers them)
+    frames = list(frames)
+    aligned = [dict(frame.items()) for frame in frames]
+    for col in {col for frame in frames for col in frame.columns}:
+        parts = [frame[col] for frame in frames if col in frame.columns]
+        if not all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            continue
+        # union_categoricals needs one dtype of categories, but e.g. an empty
+        # frame read back from Parquet has object categories, so bring every
+        # part to the dtype of the first one that has any
+        dtypes = [part.cat.categories.dtype for part in parts if len(part.cat.categories)]
+        if dtypes:
+            parts = [part.cat.set_categories(part.cat.categories.astype(dtypes[0])) for part in parts]
+        categories = union_categoricals(parts, sort_categories=True).categories
+        for columns in aligned:
+            if col in columns:
+                columns[col] = columns[col].cat.set_categories(categories)
+
+    return pd.concat([pd.DataFrame(columns, copy=False) for columns in aligned], ignore_index=True)
+
 
 def create_log_file(df_clean, today, col):
     #add today's date to the file name
@@ -117,144 +429,6 @@ def create_log_file(df_clean, today, col):
             f.write(f'There are {df_clean[c].nunique()} unique values in {c} column\n') 
             f.write('\n')
 
-def create_line_chart(df_clean, today_date):
-    # Set the default font to Arial or a similar sans-serif font
-    mpl.rcParams['font.family'] = 'sans-serif'
-    mpl.rcParams['font.sans-serif'] = 'Arial'
-
-    # Assuming df_clean has CloseDate and EstimatedTotalProgramFunding columns
-    # Convert CloseDate to month and filter for the next 12 months
-    df_clean['Month'] = df_clean['CloseDate'].dt.to_period('M')
-    next_12_months = pd.period_range(start=datetime.now(), periods=12, freq='M')
-    df_clean = df_clean[df_clean['Month'].isin(next_12_months)]
-
-    # Group by month and sum the funding
-    monthly_funding = df_clean.groupby('Month')['EstimatedTotalProgramFunding'].sum()
-
-    # Convert funding to millions for the Y axis
-    monthly_funding_in_millions = monthly_funding / 1e6
-
-    # Plotting
-    plt.figure(figsize=(6, 2))  # Adjust the size to fit 1/3rd of the PDF page height
-    plt.plot(monthly_funding_in_millions.index.astype(str), monthly_funding_in_millions.values, 
-            marker='', linestyle='-', linewidth=1)
-    plt.xticks(rotation=45)
-    plt.xlabel('Month')
-    plt.ylabel('In Million')
-    plt.title('Estimated Total Program Funding')
-    plt.gca().spines['top'].set_visible(False)
-    plt.gca().spines['right'].set_visible(False)
-    plt.tight_layout()
-
-    # Save the plot as an image
-    plt.savefig('line_chart.png')
-    plt.close()
-
-def create_pdf(df_clean, today):
-
-    DE = df_clean.query('AgencyName == "Department of Education" \
-              and CloseDate >= @today')
-
-    #This is the method to format and sum the EstimatedTotalProgramFunding column
-    #and print the results to the console for easy sharing.
-    formatted_funding = "${:,.0f}".format(DE["EstimatedTotalProgramFunding"].sum())
-
-    # Define the PDF file name
-    filename = "Current_Opportunities.pdf"
-
-    # Create a canvas
-    c = canvas.Canvas(filename, pagesize=letter)
-
-    # Define title and sub-header
-    title = "Current Opportunities"
-    today_date = datetime.now().strftime("%B %d, %Y")  # Date in long format
-
-    # Add title and sub-header to the canvas
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(inch, 10*inch, title)
-    c.setFont("Helvetica", 12)
-    c.drawString(inch, 9.75*inch, today_date)
-
-    # Create a paragraph with three generic sentences
-    styles = getSampleStyleSheet()
-    paragraph_text = (
-        "In the realm of educational advancement, the Department of Education consistently offers a multitude of "
-        "grant opportunities, aiming to foster innovation and progress in learning environments. Key values essential "
-        "for the success of these grants include a deep commitment to educational equity, a thorough understanding of "
-        "pedagogical best practices, and a strong alignment of project goals with the Department's vision. Currently, "
-        f"there is a notable Estimated Total Program Funding of {formatted_funding}, accessible as of {today_date}, "
-        "a testament to the Department's dedication to empowering educational initiatives. Successful grant applications "
-        "typically demonstrate not only a robust educational impact but also a sustainable and scalable model, ensuring "
-        "that the benefits of the grant extend beyond the immediate project scope and contribute meaningfully to the "
-        "broader educational landscape."
-    )
-    paragraph = Paragraph(paragraph_text, style=styles["Normal"])
-
-    # Draw the paragraph on the canvas
-    paragraph.wrapOn(c, 6.5*inch, 9*inch)
-    paragraph.drawOn(c, inch, 8*inch)
-
-    chart_image = Image('line_chart.png')
-    chart_image.drawHeight = 3*inch  # Adjust the height to 1/3rd of the page height
-    chart_image.drawWidth = 7*inch  # Adjust the width to fit the page
-    chart_image.wrapOn(c, 7.5*inch, 9*inch)
-    chart_image.drawOn(c, inch, 5*inch)  # Adjust the position as needed
-
-    # Additional paragraph text
-    additional_paragraph_text = ("As we can see, there are millions of dollars in funding available for the next 12 months."
-                                "The chart above shows the estimated total program funding by month for the next 12 months."
-                                "The chart was created using Python and the Pandas and Matplotlib libraries."
-                                "Contact us to learn more about how we can help you with your grant application.")
-
-    # Create a Paragraph object with the additional paragraph
-    additional_paragraph = Paragraph(additional_paragraph_text, style=styles["Normal"])
-
-    # Draw the additional paragraph on the canvas
-    additional_paragraph.wrapOn(c, 6.5*inch, 9*inch)
-    additional_paragraph.drawOn(c, inch, 4*inch)  # Adjust the position as needed
-    # Save the PDF
-    c.save()
-
-
-def create_bubble_plot():
-    # Load the dataset
-    file_path = r"C:\Python\Grants_dot_gov\GrantsDBExtract20211006v2.csv"  # Update with the path to your data file
-    grants_data = pd.read_csv(file_path)
-
-    # Convert CloseDate to datetime and calculate the number of days from today
-    grants_data['CloseDate'] = pd.to_datetime(grants_data['CloseDate'], errors='coerce')
-    today = datetime.now()
-    grants_data['DaysUntilClose'] = (grants_data['CloseDate'] - today).dt.days
-
-    # # Handle NaN values in 'EstimatedTotalProgramFunding'
-    filtered_data = grants_data.dropna(subset=['EstimatedTotalProgramFunding'])
-
-    # Group by AgencyName and sum the EstimatedTotalProgramFunding, then take the top 20
-    top_agencies = filtered_data.groupby('AgencyName')['EstimatedTotalProgramFunding'].sum().nlargest(20).index
-
-    # Filter the dataset for only these top agencies
-    filtered_data = filtered_data[filtered_data['AgencyName'].isin(top_agencies)].query('CloseDate >= @today')    
-    filtered_data2 = filtered_data[filtered_data['DaysUntilClose'] > 0]
-
-    # Create the bubble plot with the adjusted data
-    fig = px.scatter(
-        filtered_data2,
-        x="DaysUntilClose",
-        y="ExpectedNumberOfAwards",
-        size="EstimatedTotalProgramFunding",
-        color="AgencyName",
-        hover_name="AgencyName",
-        size_max=60,
-        title="Bubble Plot of Grant Opportunities by Top Funding Agencies"
-    )
-
-    fig.show()
-
-    # %%
-
-    fig.write_html("Bubble.html")  # Replace with your desired file path
-
-
 def agencies(df_clean):
     today = datetime.today()
     agencies = df_clean \
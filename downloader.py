@@ -0,0 +1,179 @@
+'''
+Resumable, verified downloads of the grants.gov extract zips.
+
+fetch() streams a URL to a .part file next to the target and only renames it
+into place once the size (and, when the server's ETag is an MD5 as on S3,
+the checksum) has been verified, so an interrupted download can never be
+mistaken for a complete one. An interrupted .part file is resumed with an
+HTTP Range request.
+
+Every completed download gets a small .meta.json sidecar holding its ETag,
+Last-Modified, size and MD5. It is used to send If-None-Match /
+If-Modified-Since, so an unchanged extract is not downloaded again.
+
+All requests go through one pooled requests.Session with retries. The base
+URL can be pointed at any HTTP server (e.g. a local stand-in for tests),
+either per call or for the whole process by setting EXTRACT_BASE_URL.
+'''
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from snapshot_cache import write_json
+
+EXTRACT_BASE_URL = "https://prod-grants-gov-chatbot.s3.amazonaws.com/extracts"
+TIMEOUT = (10, 60)  # seconds to connect, seconds between bytes
+CHUNK_SIZE = 1024 * 1024
+
+SESSION = None
+
+
+def extract_url(extract_date, base_url=None):
+    # EXTRACT_BASE_URL is read here rather than bound as a default, so
+    # setting it redirects every download
+    return f"{base_url or EXTRACT_BASE_URL}/GrantsDBExtract{extract_date}v2.zip"
+
+
+def new_session(pool_size=8, retries=3):
+    # Session with retries and a pool of pool_size connections per host
+    retry = Retry(total=retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET', 'HEAD'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    # One shared session, so connections are reused between downloads.
+    # Callers that need a given pool size create their own with new_session.
+    global SESSION
+    if SESSION is None:
+        SESSION = new_session()
+    return SESSION
+
+
+def read_meta(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_complete(dest_path):
+    # A file counts as downloaded only when fetch() finished it
+    meta = read_meta(dest_path + '.meta.json')
+    return meta is not None and os.path.exists(dest_path) and os.path.getsize(dest_path) == meta['size']
+
+
+def md5_etag(etag):
+    # S3 ETags of single-part uploads are the MD5 of the content
+    etag = (etag or '').strip('"')
+    return etag if re.fullmatch(r'[0-9a-f]{32}', etag) else None
+
+
+def fetch(url, dest_path, session=None, timeout=TIMEOUT):
+    # Download url to dest_path. Returns 'downloaded', 'not_modified' or
+    # 'missing' (the server has no such file); raises on any other failure.
+    session = session or get_session()
+    part_path = dest_path + '.part'
+    meta_path = dest_path + '.meta.json'
+    part_meta_path = part_path + '.meta.json'
+
+    headers = {}
+    meta = read_meta(meta_path) if is_complete(dest_path) else None
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    # Resume a previous partial download, as long as the file on the server
+    # is still the one it started from (If-Range)
+    part_meta = read_meta(part_meta_path)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) and part_meta else 0
+    if offset and (part_meta.get('etag') or part_meta.get('last_modified')):
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = part_meta.get('etag') or part_meta['last_modified']
+    else:
+        offset = 0
+
+    response = session.get(url, headers=headers, stream=True, timeout=timeout)
+    with response:
+        if response.status_code == 304:
+            print('Extract has not changed since it was downloaded')
+            return 'not_modified'
+        if response.status_code in (403, 404):
+            # S3 answers 403 for keys that do not exist
+            return 'missing'
+        if response.status_code == 416:
+            # The partial file is no longer valid for this resource
+            os.remove(part_path)
+            return fetch(url, dest_path, session=session, timeout=timeout)
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 206:
+            print(f'Resuming download at {offset:,} bytes')
+            total = int(response.headers['Content-Range'].rsplit('/', 1)[-1])
+            etag = etag or part_meta.get('etag')
+            last_modified = last_modified or part_meta.get('last_modified')
+        else:
+            offset = 0
+            total = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+        write_json({'etag': etag, 'last_modified': last_modified}, part_meta_path)
+
+        md5 = hashlib.md5()
+        mode = 'ab' if offset else 'wb'
+        if offset:
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    md5.update(chunk)
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                md5.update(chunk)
+
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        raise IOError(f'Download of {url} is incomplete: {size:,} of {total:,} bytes')
+    expected_md5 = md5_etag(etag)
+    if expected_md5 and md5.hexdigest() != expected_md5:
+        os.remove(part_path)
+        os.remove(part_meta_path)
+        raise IOError(f'Download of {url} does not match its checksum')
+
+    os.replace(part_path, dest_path)
+    write_json({'etag': etag, 'last_modified': last_modified, 'size': size, 'md5': md5.hexdigest()}, meta_path)
+    os.remove(part_meta_path)
+    return 'downloaded'
+
+
+def fetch_extract(download_space, extract_date, fallback_days=0, base_url=None, session=None):
+    # Make sure the extract for extract_date is in download_space. When it
+    # is not published yet, fall back up to fallback_days earlier extracts.
+    # Returns (zip path, date of the extract found) or (None, None).
+    os.makedirs(download_space, exist_ok=True)
+    day = datetime.strptime(extract_date, '%Y%m%d')
+    for days_back in range(fallback_days + 1):
+        date = (day - timedelta(days=days_back)).strftime('%Y%m%d')
+        zip_path = os.path.join(download_space, f"GrantsDBExtract{date}v2.zip")
+
+        status = fetch(extract_url(date, base_url), zip_path, session=session)
+        if status != 'missing':
+            if days_back:
+                print(f'Extract for {extract_date} is not available yet, using {date}')
+            return zip_path, date
+        if is_complete(zip_path):
+            # Gone from the server, but we already have it
+            return zip_path, date
+    return None, None
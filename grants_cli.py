@@ -0,0 +1,208 @@
+'''
+Command line entry point for scheduled runs.
+
+    python grants_cli.py fetch  --download-space DIR [--date YYYYMMDD] [--fallback-days N]
+    python grants_cli.py clean  --download-space DIR --cache-space DIR [--store-space DIR]
+                                [--store-db FILE] [--archive-space DIR] [--date YYYYMMDD]
+                                [--fallback-days N]
+    python grants_cli.py report --cache-space DIR --out-dir DIR [--store-space DIR]
+                                [--agencies NAME ... | --agencies all] [--date YYYYMMDD]
+
+fetch only downloads (or revalidates) the extract zip, clean turns it into
+the cleaned snapshot (plus the incremental store, the SQLite store and the
+history archive when their locations are given) and report renders the
+charts and PDFs from a snapshot. Like fetch, clean falls back to the newest
+extract of the previous --fallback-days days, so `fetch && clean` also works
+on a day without a new extract. Each command imports only what it uses, so
+the fetch and clean jobs never load pandas' plotting libraries; see
+benchmarks/bench_pipeline.py for the import time of each command.
+
+--run-log appends an instrumentation record of the command (see
+instrumentation.py).
+'''
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+from instrumentation import RunRecorder
+
+
+def fetch(args, run):
+    import downloader
+
+    with run.stage('fetch_extract'):
+        zip_path, extract_date = downloader.fetch_extract(args.download_space, args.date,
+                                                          fallback_days=args.fallback_days,
+                                                          base_url=args.base_url)
+    if zip_path is None:
+        print(f'No extract was published in the last {args.fallback_days + 1} days')
+        return 1
+    run.record['extract_date'] = extract_date
+    print(zip_path)
+    return 0
+
+
+def zip_path(download_space, extract_date):
+    return os.path.join(download_space, f"GrantsDBExtract{extract_date}v2.zip")
+
+
+def newest_extract(args):
+    # The newest date from --date back --fallback-days days that is either
+    # downloaded (the date fetch settled on) or already cleaned
+    import downloader
+    import snapshot_cache
+
+    day = datetime.strptime(args.date, '%Y%m%d')
+    for days_back in range(args.fallback_days + 1):
+        date = (day - timedelta(days=days_back)).strftime('%Y%m%d')
+        if downloader.is_complete(zip_path(args.download_space, date)) \
+                or os.path.exists(snapshot_cache.snapshot_path(args.cache_space, date)):
+            return date
+    return None
+
+
+def clean(args, run):
+    import zipfile
+
+    import snapshot_cache
+    from download_and_clean_raw_data import clean_df, xml_to_df
+
+    extract_date = newest_extract(args)
+    if extract_date is None:
+        print(f'No extract of the last {args.fallback_days + 1} days is downloaded, run fetch first')
+        return 1
+    if extract_date != args.date:
+        print(f'Extract for {args.date} is not downloaded, using {extract_date}')
+    run.record['extract_date'] = extract_date
+
+    delta = None
+    df_clean = snapshot_cache.load_snapshot(args.cache_space, extract_date)
+    if df_clean is not None:
+        # The stores below still catch up, e.g. after a crash or a run
+        # without --store-db
+        print(f'Extract {extract_date} is already cleaned')
+        if args.store_space:
+            from incremental import load_delta
+            delta = load_delta(args.store_space, extract_date)
+    else:
+        with run.stage('xml_to_df') as stage:
+            with zipfile.ZipFile(zip_path(args.download_space, extract_date)) as z, \
+                    z.open(f"GrantsDBExtract{extract_date}v2.xml") as xml_file:
+                df = xml_to_df(xml_file)
+            stage['rows'] = len(df)
+
+        with run.stage('clean_df') as stage:
+            if args.store_space:
+                from incremental import apply_extract
+                df_clean, delta = apply_extract(df, args.store_space, extract_date)
+                stage['changes'] = len(df_clean) if delta is None else len(delta)
+            else:
+                df_clean = clean_df(df)
+            stage['rows'] = len(df_clean)
+
+        with run.stage('save_snapshot') as stage:
+            snapshot_cache.save_snapshot(df_clean, args.cache_space, extract_date)
+            snapshot_cache.evict_snapshots(args.cache_space, keep_days=args.keep_days)
+            stage['rows'] = len(df_clean)
+
+    if args.store_db:
+        from opportunity_store import update_store
+        with run.stage('update_store') as stage:
+            update_store(args.store_db, df_clean, extract_date, delta)
+            stage['rows'] = len(df_clean) if delta is None else len(delta)
+
+    if args.archive_space:
+        from history_archive import archive_extract
+        with run.stage('archive_extract') as stage:
+            stage['rows'] = archive_extract(args.archive_space, df_clean, extract_date, delta)
+
+    if args.store_space:
+        from aggregates import refresh_cube
+        with run.stage('refresh_cube') as stage:
+            stage['rows'] = len(refresh_cube(args.store_space, df_clean, extract_date, delta))
+    return 0
+
+
+def report(args, run):
+    import snapshot_cache
+    from aggregates import build_cube, refresh_cube
+
+    if args.date:
+        extract_date, path = args.date, snapshot_cache.snapshot_path(args.cache_space, args.date)
+    else:
+        extract_date, path = snapshot_cache.latest_snapshot(args.cache_space)
+    if extract_date is None or not os.path.exists(path):
+        print('There is no cleaned snapshot to report on, run clean first')
+        return 1
+    run.record['extract_date'] = extract_date
+
+    with run.stage('load_snapshot') as stage:
+        df_clean = snapshot_cache.read_frame(path)
+        stage['rows'] = len(df_clean)
+
+    with run.stage('refresh_cube') as stage:
+        if args.store_space:
+            cube = refresh_cube(args.store_space, df_clean, extract_date)
+        else:
+            cube = build_cube(df_clean, extract_date)
+        stage['rows'] = len(cube)
+
+    # The reporting libraries are only imported here
+    from report_pipeline import render_reports
+    agencies = args.agencies or None
+    if agencies == ['all']:
+        agencies = 'all'
+    with run.stage('render_reports') as stage:
+        render_reports(df_clean, cube, datetime.today().strftime('%Y%m%d'), agencies=agencies,
+                       out_dir=args.out_dir, max_workers=args.workers)
+        stage['rows'] = len(df_clean)
+    return 0
+
+
+def build_parser():
+    today = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--run-log', help='JSON lines file the run record is appended to')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = commands.add_parser('fetch', help='download the extract zip')
+    fetch_parser.add_argument('--date', default=today, help='extract date, YYYYMMDD (default: today)')
+    fetch_parser.add_argument('--download-space', required=True)
+    fetch_parser.add_argument('--fallback-days', type=int, default=3,
+                              help='use an earlier extract when this one is not published yet')
+    fetch_parser.add_argument('--base-url', help='where the extracts are published (default: grants.gov)')
+    fetch_parser.set_defaults(func=fetch)
+
+    clean_parser = commands.add_parser('clean', help='parse and clean a downloaded extract')
+    clean_parser.add_argument('--date', default=today, help='extract date, YYYYMMDD (default: today)')
+    clean_parser.add_argument('--download-space', required=True)
+    clean_parser.add_argument('--fallback-days', type=int, default=3,
+                              help='use the newest downloaded extract of this many earlier days')
+    clean_parser.add_argument('--cache-space', required=True)
+    clean_parser.add_argument('--keep-days', type=int, default=7, help='snapshots to keep')
+    clean_parser.add_argument('--store-space', help='clean incrementally against the store (and keep the cube) here')
+    clean_parser.add_argument('--store-db', help='SQLite opportunity store to update')
+    clean_parser.add_argument('--archive-space', help='history archive to append to')
+    clean_parser.set_defaults(func=clean)
+
+    report_parser = commands.add_parser('report', help='render the charts and PDFs')
+    report_parser.add_argument('--date', help='extract date, YYYYMMDD (default: the newest snapshot)')
+    report_parser.add_argument('--cache-space', required=True)
+    report_parser.add_argument('--store-space', help='store_space of the clean runs, to reuse their cube')
+    report_parser.add_argument('--out-dir', default='.')
+    report_parser.add_argument('--agencies', nargs='*', default=[],
+                               help="also write a chart and PDF per agency ('all' for every agency)")
+    report_parser.add_argument('--workers', type=int, help='render processes (default: CPU count)')
+    report_parser.set_defaults(func=report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with RunRecorder(args.run_log, command=args.command) as run:
+        return args.func(args, run)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
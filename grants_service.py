@@ -0,0 +1,271 @@
+'''
+Serve the cleaned grants.gov data over HTTP from one long-running process.
+
+The service loads the newest cleaned snapshot (see snapshot_cache) and its
+aggregate cube once and answers every request from memory, so consumers no
+longer pay the parse and clean cost in their own processes (or rely on the
+module-level df_clean of ETL_Grants_dot_gov_V2 inside one Jupyter session).
+A watcher thread picks up the snapshot of a newer extract as soon as the ETL
+run writes it, loads it in the background and swaps it in with a single
+assignment, so a request always sees one consistent extract.
+
+Responses are cached per extract (and day, since "open" depends on it);
+swapping in a new extract drops the cache. Only successful responses are
+cached.
+
+    GET /health                          extract date and row count
+    GET /agencies                        open funding per agency (aggregates.agency_totals)
+    GET /opportunities?agency_name=...   filtered rows (the filters of
+                                         opportunity_store.query_opportunities,
+                                         plus columns=a,b and limit=)
+    GET /search?q=...                    ranked full-text search (needs --store-db at
+                                         the extract being served)
+    GET /report.pdf?agency=...           Current Opportunities PDF of one agency
+
+    python grants_service.py --cache-space C:/Python/Grants_dot_gov/cache --port 8050
+'''
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# The reports are drawn on request threads, which needs a non-GUI backend
+import matplotlib
+matplotlib.use('Agg')
+
+import pandas as pd
+
+import aggregates
+import opportunity_store
+import snapshot_cache
+from reports import create_line_chart, create_pdf
+
+Dataset = namedtuple('Dataset', ['extract_date', 'df_clean', 'cube'])
+
+FILTERS = ['agency_name', 'agency_code', 'close_after', 'close_before', 'category',
+           'eligible_applicants', 'min_funding', 'max_funding']
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def filter_opportunities(df_clean, agency_name=None, agency_code=None, close_after=None,
+                         close_before=None, category=None, eligible_applicants=None,
+                         min_funding=None, max_funding=None):
+    # In-memory version of opportunity_store.query_opportunities
+    mask = pd.Series(True, index=df_clean.index)
+    for col, value in (('AgencyName', agency_name), ('AgencyCode', agency_code),
+                       ('CategoryOfFundingActivity', category),
+                       ('EligibleApplicants', eligible_applicants)):
+        if value is not None:
+            mask &= df_clean[col] == value
+    if close_after is not None:
+        mask &= df_clean['CloseDate'] >= pd.Timestamp(close_after)
+    if close_before is not None:
+        mask &= df_clean['CloseDate'] <= pd.Timestamp(close_before)
+    if min_funding is not None:
+        mask &= df_clean['EstimatedTotalProgramFunding'] >= min_funding
+    if max_funding is not None:
+        mask &= df_clean['EstimatedTotalProgramFunding'] <= max_funding
+    return df_clean[mask.fillna(False)]
+
+
+def query_params(query):
+    # Single-valued query parameters, with the numeric ones converted
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    try:
+        for name in ('min_funding', 'max_funding'):
+            if name in params:
+                params[name] = float(params[name])
+        if 'limit' in params:
+            params['limit'] = int(params['limit'])
+    except ValueError as error:
+        raise BadRequest(str(error))
+    return params
+
+
+def json_rows(extract_date, df):
+    rows = df.to_json(orient='records', date_format='iso')
+    return f'{{"extract_date": "{extract_date}", "count": {len(df)}, "rows": {rows}}}'.encode()
+
+
+class GrantsService:
+    def __init__(self, cache_space, store_space=None, store_db=None, cache_size=256):
+        self.cache_space = cache_space
+        self.store_space = store_space
+        self.store_db = store_db
+        self.cache_size = cache_size
+        self.dataset = None
+        self.responses = OrderedDict()
+        self.responses_lock = threading.Lock()
+        # matplotlib and the shared report file names are not thread safe
+        self.report_lock = threading.Lock()
+
+    def load(self, extract_date, path):
+        df_clean = snapshot_cache.read_frame(path)
+        cube = None
+        if self.store_space:
+            cube, cube_date = aggregates.load_cube(self.store_space)
+            if cube_date != extract_date:
+                cube = None
+        if cube is None:
+            cube = aggregates.build_cube(df_clean, extract_date)
+        return Dataset(extract_date, df_clean, cube)
+
+    def refresh(self):
+        # Swap in the newest snapshot if it is newer than the one served;
+        # returns True when it did
+        extract_date, path = snapshot_cache.latest_snapshot(self.cache_space)
+        if extract_date is None or (self.dataset and extract_date <= self.dataset.extract_date):
+            return False
+
+        dataset = self.load(extract_date, path)
+        self.dataset = dataset
+        with self.responses_lock:
+            self.responses.clear()
+        print(f'Serving extract {extract_date} ({len(dataset.df_clean):,} opportunities)')
+        return True
+
+    def watch(self, interval=60):
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as error:
+                    # Keep serving the current extract
+                    print(f'Could not load the new extract: {error!r}')
+        threading.Thread(target=poll, daemon=True).start()
+
+    def respond(self, target):
+        # (status, content type, body) for a request target, from the cache
+        # when this extract and day were already answered
+        dataset = self.dataset
+        if dataset is None:
+            return 503, 'application/json', b'{"error": "no extract loaded yet"}'
+
+        key = (dataset.extract_date, datetime.today().strftime('%Y%m%d'), target)
+        with self.responses_lock:
+            if key in self.responses:
+                self.responses.move_to_end(key)
+                return self.responses[key]
+
+        url = urlsplit(target)
+        try:
+            response = self.route(dataset, url.path, query_params(url.query))
+        except BadRequest as error:
+            return 400, 'application/json', json.dumps({'error': str(error)}).encode()
+        except Exception as error:
+            # Answer instead of dropping the connection
+            print(f'Error answering {target}: {error!r}')
+            return 500, 'application/json', json.dumps({'error': repr(error)}).encode()
+
+        if response[0] == 200:
+            with self.responses_lock:
+                self.responses[key] = response
+                while len(self.responses) > self.cache_size:
+                    self.responses.popitem(last=False)
+        return response
+
+    def route(self, dataset, path, params):
+        today = datetime.today().strftime('%Y%m%d')
+        if path == '/health':
+            body = {'extract_date': dataset.extract_date, 'rows': len(dataset.df_clean)}
+            return 200, 'application/json', json.dumps(body).encode()
+
+        if path == '/agencies':
+            return 200, 'application/json', json_rows(dataset.extract_date,
+                                                      aggregates.agency_totals(dataset.cube, today))
+
+        if path == '/opportunities':
+            try:
+                rows = filter_opportunities(dataset.df_clean, **{name: params[name]
+                                                                 for name in FILTERS if name in params})
+            except (KeyError, ValueError) as error:
+                raise BadRequest(str(error))
+            if 'columns' in params:
+                columns = params['columns'].split(',')
+                unknown = [col for col in columns if col not in rows.columns]
+                if unknown:
+                    raise BadRequest(f'Unknown columns {unknown}')
+                rows = rows[columns]
+            if 'limit' in params:
+                rows = rows.head(params['limit'])
+            return 200, 'application/json', json_rows(dataset.extract_date, rows)
+
+        if path == '/search':
+            if not self.store_db:
+                return 404, 'application/json', b'{"error": "search needs the service to run with --store-db"}'
+            if not params.get('q'):
+                raise BadRequest('Missing q')
+            # The store is updated by the ETL run on its own schedule, so
+            # its results are only served when they are of the same extract
+            store_date = opportunity_store.store_extract_date(self.store_db)
+            if store_date != dataset.extract_date:
+                error = f'the search store is at extract {store_date}, serving {dataset.extract_date}'
+                return 503, 'application/json', json.dumps({'error': error}).encode()
+            filters = {name: params[name] for name in FILTERS if name in params}
+            try:
+                rows = opportunity_store.search_opportunities(self.store_db, params['q'],
+                                                              limit=params.get('limit', 50), **filters)
+            except ValueError as error:
+                raise BadRequest(str(error))
+            return 200, 'application/json', json_rows(dataset.extract_date, rows)
+
+        if path == '/report.pdf':
+            agency_name = params.get('agency', 'Department of Education')
+            if not (dataset.cube['AgencyName'] == agency_name).any():
+                return 404, 'application/json', json.dumps({'error': f'Unknown agency {agency_name}'}).encode()
+            with self.report_lock, tempfile.TemporaryDirectory() as work_dir:
+                chart_file = os.path.join(work_dir, 'line_chart.png')
+                pdf_file = os.path.join(work_dir, 'Current_Opportunities.pdf')
+                create_line_chart(None, today, cube=dataset.cube, agency_name=agency_name, filename=chart_file)
+                create_pdf(None, today, cube=dataset.cube, agency_name=agency_name,
+                           filename=pdf_file, chart_file=chart_file)
+                with open(pdf_file, 'rb') as f:
+                    return 200, 'application/pdf', f.read()
+
+        return 404, 'application/json', b'{"error": "not found"}'
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, content_type, body = self.server.service.respond(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(service, host='127.0.0.1', port=8050, poll_seconds=60):
+    service.refresh()
+    service.watch(poll_seconds)
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.service = service
+    print(f'Listening on http://{host}:{port}')
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cache-space', required=True, help='cache_space of the ETL runs')
+    parser.add_argument('--store-space', help='store_space of the ETL runs, to reuse their aggregate cube')
+    parser.add_argument('--store-db', help='opportunity store of the ETL runs, for /search')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--poll', type=int, default=60, help='seconds between checks for a new extract')
+    args = parser.parse_args()
+
+    serve(GrantsService(args.cache_space, args.store_space, args.store_db), args.host, args.port, args.poll)
+
+
+if __name__ == '__main__':
+    main()
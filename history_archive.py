@@ -0,0 +1,155 @@
+'''
+Append-only history of the cleaned extracts.
+
+Instead of keeping every daily extract, the archive stores one compressed
+Parquet partition per extract date, GrantsDBHistory{date}.parquet, holding
+only the opportunities that were new or changed on that date (compared on
+OpportunityID + LastUpdatedDate, like incremental.compute_delta) and a
+tombstone row for every opportunity that disappeared. The first partition
+is the full baseline; a date without any change gets no partition, but like
+every archived date it is listed in GrantsDBHistory.json.
+
+Every row is a version that is valid from its ValidFrom date until the next
+version of the same opportunity (SCD type 2). versions() returns them with
+their ValidTo, and as_of() rebuilds the state of any archived date, e.g.
+every opportunity that was open on 2025-03-01.
+
+The day's partition is taken from the incremental.apply_extract delta when
+it was computed against the newest archived extract, so the archive keeps
+no state of its own. Without one, the previous state (given, or replayed
+from the partitions) is compared with the cleaned extract instead.
+'''
+import glob
+import json
+import os
+
+import pandas as pd
+
+import incremental
+import snapshot_cache
+from download_and_clean_raw_data import concat_clean
+
+KEY = 'OpportunityID'
+PARTITION_PREFIX = 'GrantsDBHistory'
+COMPRESSION = 'zstd'
+
+
+def partition_path(archive_space, extract_date):
+    return os.path.join(archive_space, f"{PARTITION_PREFIX}{extract_date}.parquet")
+
+
+def meta_path(archive_space):
+    return os.path.join(archive_space, f'{PARTITION_PREFIX}.json')
+
+
+def partition_dates(archive_space):
+    # Extract dates with a partition, oldest first
+    paths = glob.glob(os.path.join(archive_space, f'{PARTITION_PREFIX}[0-9]*.parquet'))
+    return sorted(os.path.basename(path)[len(PARTITION_PREFIX):-len('.parquet')] for path in paths)
+
+
+def archived_dates(archive_space):
+    # Every archived extract date, with or without a partition, oldest first.
+    # The metadata is written after the partition, so a partition it does
+    # not list yet still counts.
+    dates = set(partition_dates(archive_space))
+    if os.path.exists(meta_path(archive_space)):
+        with open(meta_path(archive_space)) as f:
+            dates.update(json.load(f)['dates'])
+    return sorted(dates)
+
+
+def write_partition(rows, path):
+    # Same write-then-rename as snapshot_cache.write_frame
+    rows.to_parquet(path + '.part', compression=COMPRESSION, index=False)
+    os.replace(path + '.part', path)
+
+
+def read_partitions(archive_space, until=None, columns=None):
+    # All versions archived up to and including the date until
+    dates = [date for date in partition_dates(archive_space) if until is None or date <= until]
+    if columns is not None:
+        columns = list(dict.fromkeys([KEY, 'ValidFrom', 'Removed'] + list(columns)))
+    frames = [pd.read_parquet(partition_path(archive_space, date), columns=columns) for date in dates]
+    if not frames:
+        return None
+    return concat_clean(frames)
+
+
+def latest_versions(history):
+    # The newest version of every opportunity that has not been removed
+    latest = (history
+              .sort_values('ValidFrom', kind='stable')
+              .drop_duplicates(KEY, keep='last'))
+    return latest[~latest['Removed']].drop(columns=['ValidFrom', 'Removed']).reset_index(drop=True)
+
+
+def archive_extract(archive_space, df_clean, extract_date, delta=None, previous=None):
+    # Append the changes of the cleaned extract for extract_date. delta is
+    # the incremental.apply_extract delta for extract_date; previous can be
+    # (date, cleaned extract) of the newest archived date when the caller
+    # has it. Extracts have to be archived in date order; a date the archive
+    # already goes up to is skipped. Returns the number of rows written.
+    os.makedirs(archive_space, exist_ok=True)
+    dates = archived_dates(archive_space)
+    latest_date = dates[-1] if dates else None
+    if latest_date is not None and extract_date <= latest_date:
+        print(f'Extract {extract_date} is already archived')
+        return 0
+
+    valid_from = pd.Timestamp(extract_date)
+    if latest_date is None:
+        print('Starting the history archive')
+        changed, removed_ids = df_clean, []
+    elif incremental.applies_to(delta, latest_date):
+        changed = delta[delta['ChangeType'].isin(['insert', 'update'])].drop(columns='ChangeType')
+        removed_ids = delta.loc[delta['ChangeType'] == 'remove', KEY]
+    else:
+        if previous is not None and previous[0] == latest_date:
+            current = previous[1]
+        else:
+            print('Replaying the history archive to compare with')
+            current = latest_versions(read_partitions(archive_space))
+        inserted, updated, removed = incremental.compute_delta(current, df_clean)
+        changed, removed_ids = df_clean[inserted | updated], current.loc[removed, KEY]
+
+    tombstones = pd.DataFrame({KEY: removed_ids, 'ValidFrom': valid_from, 'Removed': True})
+    rows = concat_clean([changed.assign(ValidFrom=valid_from, Removed=False), tombstones])
+    if len(rows):
+        print(f'Archiving {len(changed)} new or updated and {len(tombstones)} removed opportunities')
+        write_partition(rows, partition_path(archive_space, extract_date))
+    else:
+        print('No changes to archive')
+    snapshot_cache.write_json({'dates': dates + [extract_date]}, meta_path(archive_space))
+    return len(rows)
+
+
+def as_of(archive_space, date, columns=None, open_only=False):
+    # The opportunities as they were in the newest extract archived on or
+    # before date. open_only keeps those whose CloseDate had not passed.
+    until = pd.Timestamp(date).strftime('%Y%m%d')
+    history = read_partitions(archive_space, until=until,
+                              columns=None if columns is None else list(columns) + ['CloseDate'])
+    if history is None:
+        return None
+
+    state = latest_versions(history)
+    if open_only:
+        state = state[state['CloseDate'] >= pd.Timestamp(date)].reset_index(drop=True)
+    if columns is not None:
+        state = state[list(dict.fromkeys([KEY] + list(columns)))]
+    return state
+
+
+def versions(archive_space, opportunity_ids=None, columns=None):
+    # Every archived version (removals included) with its validity range:
+    # ValidFrom inclusive, ValidTo exclusive, ValidTo missing while current
+    history = read_partitions(archive_space, columns=columns)
+    if history is None:
+        return None
+    if opportunity_ids is not None:
+        history = history[history[KEY].isin(opportunity_ids)]
+
+    history = history.sort_values([KEY, 'ValidFrom'], kind='stable').reset_index(drop=True)
+    history['ValidTo'] = history.groupby(KEY)['ValidFrom'].shift(-1)
+    return history
@@ -0,0 +1,167 @@
+'''
+Incremental processing of consecutive grants.gov extracts.
+
+grants.gov only publishes full extracts, so every day's XML still has to be
+parsed. What changes is everything after that: the new extract is compared
+with the persistent store (the cleaned state as of the last applied extract)
+on OpportunityID + LastUpdatedDate, only inserted and updated opportunities
+go through clean_df, and the changes are applied to the store.
+
+Each run also writes the change set as its own artifact,
+GrantsDBDelta{today_date}.arrow, with a ChangeType column
+('insert', 'update' or 'remove'), so downstream jobs can work on what
+changed instead of the whole extract. Updates also carry the version they
+replaced, as 'replaced' rows, so rollups can subtract the old values.
+
+A delta only describes the step from the extract the store was at before
+(its base date, kept in GrantsDBDelta{today_date}.json and in
+delta.attrs['base_date']) to today_date, so downstream stores apply it only
+when they are at that base date themselves, and rebuild otherwise. A full
+build (no store yet, or one written by a different clean_df) writes no
+delta, as it would be the whole extract: apply_extract returns None and the
+downstream stores rebuild from the cleaned extract. Only the deltas of the
+newest keep_deltas dates are kept (evict_deltas).
+'''
+import glob
+import json
+import os
+
+import pandas as pd
+
+from download_and_clean_raw_data import clean_df, concat_clean, convert_column
+from snapshot_cache import clean_df_fingerprint, read_frame, write_frame, write_json
+
+KEY = 'OpportunityID'
+CHANGE_TYPES = ['insert', 'update', 'remove', 'replaced']
+
+
+def store_paths(store_space):
+    return (os.path.join(store_space, 'GrantsDBStore.arrow'),
+            os.path.join(store_space, 'GrantsDBStore.json'))
+
+
+def delta_paths(store_space, today_date):
+    return (os.path.join(store_space, f"GrantsDBDelta{today_date}.arrow"),
+            os.path.join(store_space, f"GrantsDBDelta{today_date}.json"))
+
+
+def load_store(store_space):
+    # Returns (store, extract date it reflects), or (None, None) when there
+    # is no store yet or it was written by a different clean_df
+    store_file, meta_file = store_paths(store_space)
+    if not os.path.exists(store_file) or not os.path.exists(meta_file):
+        return None, None
+
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get('fingerprint') != clean_df_fingerprint():
+        print('Store was written by a different clean_df, rebuilding it')
+        return None, None
+
+    return read_frame(store_file), meta['extract_date']
+
+
+def save_store(store, store_space, today_date):
+    os.makedirs(store_space, exist_ok=True)
+    store_file, meta_file = store_paths(store_space)
+    write_frame(store, store_file)
+
+    # The metadata is written last, so it never points at a store that
+    # was not fully written
+    write_json({'extract_date': today_date, 'fingerprint': clean_df_fingerprint()}, meta_file)
+
+
+def compute_delta(store, df):
+    # Compare the raw extract df with the cleaned store. Returns boolean
+    # masks over df for inserted and updated rows, and a mask over the store
+    # for removed rows.
+    updated_on = convert_column(df['LastUpdatedDate'], 'date')
+    previous_updated_on = store.set_index(KEY)['LastUpdatedDate']
+    previous_updated_on = previous_updated_on[~previous_updated_on.index.duplicated(keep='last')]
+
+    known = df[KEY].isin(previous_updated_on.index)
+    previous = df[KEY].map(previous_updated_on)
+    # Two missing dates count as unchanged
+    changed = (updated_on != previous) & ~(updated_on.isna() & previous.isna())
+
+    inserted = ~known
+    updated = known & changed
+    removed = ~store[KEY].isin(df[KEY])
+    return inserted, updated, removed
+
+
+def apply_extract(df, store_space, today_date, keep_deltas=7):
+    # Bring the store up to date with the raw extract df and write the delta.
+    # Returns the new store (the cleaned extract) and the delta, which is
+    # None after a full build.
+    store, store_date = load_store(store_space)
+    os.makedirs(store_space, exist_ok=True)
+    delta_file, delta_meta_file = delta_paths(store_space, today_date)
+
+    if store is None:
+        print('No store yet, cleaning the full extract')
+        store = clean_df(df)
+        # A delta left for today_date by an earlier store would be stale
+        for path in (delta_file, delta_meta_file):
+            if os.path.exists(path):
+                os.remove(path)
+        save_store(store, store_space, today_date)
+        evict_deltas(store_space, keep_days=keep_deltas)
+        return store, None
+    elif store_date == today_date:
+        print('Store is already up to date with this extract')
+        return store, load_delta(store_space, today_date)
+    else:
+        inserted, updated, removed = compute_delta(store, df)
+        print(f'{inserted.sum()} new, {updated.sum()} updated and {removed.sum()} removed '
+              f'opportunities since {store_date}')
+
+        # Only the opportunities that changed go through clean_df
+        cleaned = clean_df(df[inserted | updated])
+        change_type = pd.Series('update', index=cleaned.index).where(updated[inserted | updated], 'insert')
+        replaced = store[KEY].isin(cleaned[KEY])
+        changes = concat_clean([cleaned.assign(ChangeType=change_type),
+                                store[removed].assign(ChangeType='remove'),
+                                store[replaced].assign(ChangeType='replaced')])
+
+        store = concat_clean([store[~removed & ~replaced], cleaned])
+
+    changes['ChangeType'] = pd.Categorical(changes['ChangeType'], categories=CHANGE_TYPES)
+    changes.attrs['base_date'] = store_date
+
+    # The delta goes first: once the store says it is at today_date,
+    # its delta has to exist
+    write_frame(changes, delta_file)
+    write_json({'base_date': store_date}, delta_meta_file)
+    save_store(store, store_space, today_date)
+    evict_deltas(store_space, keep_days=keep_deltas)
+    return store, changes
+
+
+def load_delta(store_space, today_date):
+    delta_file, delta_meta_file = delta_paths(store_space, today_date)
+    if not os.path.exists(delta_file):
+        return None
+    delta = read_frame(delta_file)
+
+    # A delta without its metadata has an unknown base, so it is never applied
+    delta.attrs['base_date'] = None
+    if os.path.exists(delta_meta_file):
+        with open(delta_meta_file) as f:
+            delta.attrs['base_date'] = json.load(f).get('base_date')
+    return delta
+
+
+def evict_deltas(store_space, keep_days=7):
+    # Keep the deltas (and their metadata) of the newest keep_days dates
+    dates = sorted((os.path.basename(path)[len('GrantsDBDelta'):-len('.arrow')]
+                    for path in glob.glob(os.path.join(store_space, 'GrantsDBDelta*.arrow'))), reverse=True)
+    for date in dates[keep_days:]:
+        for path in delta_paths(store_space, date):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def applies_to(delta, target_date):
+    # Whether delta turns the state as of target_date into the next extract
+    return delta is not None and target_date is not None and delta.attrs.get('base_date') == target_date
@@ -0,0 +1,163 @@
+'''
+Stage-level timing and memory records for ETL runs.
+
+A RunRecorder measures every stage of a run (wall time, CPU time, peak RSS,
+bytes read/written and, when the caller fills it in, the row count) and
+appends the whole run as one JSON line to a run log, so runs can be
+compared over time.
+
+    with RunRecorder('runs.jsonl') as run:
+        with run.stage('clean') as stage:
+            df_clean = clean_df(df)
+            stage['rows'] = len(df_clean)
+
+Pass profile_dir to also save a cProfile of every stage there
+(<run_id>_<stage>.prof), and trace_memory=True to record the peak traced
+Python allocation and the top allocation sites of every stage.
+
+CPU time includes finished child processes (e.g. the report pool). Peak RSS
+and I/O counters use /proc or the resource module where available, then
+psutil if it is installed; otherwise they are recorded as null.
+'''
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def reset_peak_rss():
+    # Linux can reset the process high-water mark, which makes the peak
+    # RSS of each stage its own instead of the peak of the run so far
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss)
+    return None
+
+
+def io_bytes():
+    # (bytes read, bytes written) by this process, including network I/O
+    try:
+        counters = {}
+        with open('/proc/self/io') as f:
+            for line in f:
+                key, value = line.split(':')
+                counters[key] = int(value)
+        return counters['rchar'], counters['wchar']
+    except (OSError, KeyError, ValueError):
+        pass
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+            return counters.read_bytes, counters.write_bytes
+        except (AttributeError, psutil.Error):
+            pass
+    return None, None
+
+
+class RunRecorder:
+    def __init__(self, run_log=None, profile_dir=None, trace_memory=False, **run_info):
+        self.run_log = run_log
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        self.record = {'run_id': self.run_id, 'started': datetime.now().isoformat(timespec='seconds'),
+                       **run_info, 'stages': []}
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['wall_seconds'] = round(time.perf_counter() - self.start, 4)
+        self.record['peak_rss_bytes'] = max((s['peak_rss_bytes'] or 0 for s in self.record['stages']), default=None)
+        self.record['status'] = 'ok' if exc_type is None else f'failed: {exc_type.__name__}'
+        if self.run_log:
+            os.makedirs(os.path.dirname(os.path.abspath(self.run_log)), exist_ok=True)
+            with open(self.run_log, 'a') as f:
+                f.write(json.dumps(self.record, default=str) + '\n')
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        # Yields the stage's record; callers can add fields such as 'rows'
+        stage = {'stage': name, 'rows': None}
+        reset_peak_rss()
+        read_before, written_before = io_bytes()
+
+        profiler = cProfile.Profile() if self.profile_dir else None
+        if self.trace_memory:
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        cpu_start = cpu_seconds()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                profiler.disable()
+            stage['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+            stage['cpu_seconds'] = round(cpu_seconds() - cpu_start, 4)
+            stage['peak_rss_bytes'] = peak_rss_bytes()
+
+            read_after, written_after = io_bytes()
+            stage['bytes_read'] = read_after - read_before if read_before is not None else None
+            stage['bytes_written'] = written_after - written_before if written_before is not None else None
+
+            if self.trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                stage['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                stage['top_allocations'] = [str(stat) for stat in snapshot.statistics('lineno')[:10]]
+            if profiler:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f'{self.run_id}_{name}.prof'))
+
+            self.record['stages'].append(stage)
+            print(f"{name}: {stage['wall_seconds']:.2f} s wall, {stage['cpu_seconds']:.2f} s CPU")
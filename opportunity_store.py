@@ -0,0 +1,260 @@
+'''
+Indexed SQLite store of the cleaned opportunities.
+
+The store is filled from clean_df output and indexed on the columns the
+reports filter on, so repeated filters are index lookups instead of full
+DataFrame.query scans, and any process can run them without reloading
+the XML.
+
+Dates are stored as ISO 'YYYY-MM-DD' text, so they sort and compare
+correctly in SQL. Query results come back with the COLUMN_SCHEMA dtypes.
+
+The text fields are also indexed for full-text search (an SQLite FTS5 index
+over the opportunities table). Triggers keep the index in step with every
+insert and delete, so apply_delta updates it incrementally with each
+extract. search_opportunities ranks matches with BM25 and takes the same
+filters as query_opportunities.
+'''
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+from download_and_clean_raw_data import COLUMN_SCHEMA
+from incremental import applies_to
+
+TABLE = 'opportunities'
+INDEXED_COLUMNS = ['OpportunityID', 'AgencyName', 'AgencyCode', 'CloseDate',
+                   'CategoryOfFundingActivity', 'EligibleApplicants']
+
+SEARCH_TABLE = 'opportunities_fts'
+# Searched text fields and their BM25 weights (a title match counts most)
+SEARCH_COLUMNS = {
+    'OpportunityTitle': 10.0,
+    'Description': 1.0,
+    'CategoryExplanation': 2.0,
+    'AdditionalInformationOnEligibility': 1.0,
+}
+
+
+def connect(db_path):
+    return closing(sqlite3.connect(db_path))
+
+
+def to_sql_frame(df_clean):
+    # SQLite has no date or categorical types
+    columns = {}
+    for col, values in df_clean.items():
+        dtype = COLUMN_SCHEMA.get(col)
+        if dtype == 'date':
+            values = values.dt.strftime('%Y-%m-%d')
+        elif dtype == 'category':
+            values = values.astype(object)
+        columns[col] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def restore_dtypes(df):
+    for col in df.columns:
+        dtype = COLUMN_SCHEMA.get(col)
+        if dtype == 'date':
+            df[col] = pd.to_datetime(df[col], format='%Y-%m-%d')
+        elif dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype in ('Int32', 'Int64', 'float'):
+            df[col] = df[col].astype('float64' if dtype == 'float' else dtype)
+    return df
+
+
+def write_rows(con, df_clean):
+    to_sql_frame(df_clean).to_sql(TABLE, con, if_exists='append', index=False, chunksize=10000)
+
+
+def build_store(df_clean, db_path, today_date):
+    # Build the database next to the target and swap it in, so readers in
+    # other processes never see a half-built store
+    part_path = db_path + '.part'
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+    with connect(part_path) as con:
+        write_rows(con, df_clean)
+        for col in INDEXED_COLUMNS:
+            if col in df_clean.columns:
+                con.execute(f'CREATE INDEX idx_{col} ON {TABLE} ({col})')
+        create_search_index(con)
+        con.execute('CREATE TABLE meta (extract_date TEXT)')
+        con.execute('INSERT INTO meta VALUES (?)', (today_date,))
+        con.commit()
+    os.replace(part_path, db_path)
+
+
+def table_columns(con, table):
+    return [row[1] for row in con.execute(f'PRAGMA table_info({table})')]
+
+
+def create_search_index(con):
+    # External-content FTS5 index over the text fields of the opportunities
+    # table: the text is not stored twice, only the inverted index. Skipped
+    # when the store was built without the text fields.
+    if con.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (SEARCH_TABLE,)).fetchone():
+        return
+    if not set(SEARCH_COLUMNS) <= set(table_columns(con, TABLE)):
+        print('Store has no text fields, not building the search index')
+        return
+
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{col}' for col in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{col}' for col in SEARCH_COLUMNS)
+    con.executescript(f'''
+        CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+            {columns}, content='{TABLE}', content_rowid='rowid', tokenize='porter unicode61');
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild');
+
+        CREATE TRIGGER {SEARCH_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE} (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END;
+        CREATE TRIGGER {SEARCH_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, {columns})
+            VALUES ('delete', old.rowid, {old_values});
+        END;
+    ''')
+
+
+def apply_delta(db_path, delta, today_date):
+    # Apply an incremental.apply_extract delta: every opportunity in the
+    # delta is deleted, then inserted and updated ones are written back
+    with connect(db_path) as con:
+        ids = delta['OpportunityID'].tolist()
+        con.executemany(f'DELETE FROM {TABLE} WHERE OpportunityID = ?', [(i,) for i in ids])
+        rows = delta[delta['ChangeType'].isin(['insert', 'update'])].drop(columns='ChangeType')
+        write_rows(con, rows)
+        con.execute('UPDATE meta SET extract_date = ?', (today_date,))
+        con.commit()
+
+
+def store_extract_date(db_path):
+    if not os.path.exists(db_path):
+        return None
+    with connect(db_path) as con:
+        return con.execute('SELECT extract_date FROM meta').fetchone()[0]
+
+
+def update_store(db_path, df_clean, today_date, delta=None):
+    # Bring the store up to today_date. With an incremental.apply_extract
+    # delta computed against the extract the store is at, only the changed
+    # rows are touched; otherwise (a missed day, a full rebuild) the store
+    # is rebuilt.
+    store_date = store_extract_date(db_path)
+    if store_date == today_date:
+        print('Opportunity store is already up to date')
+    elif applies_to(delta, store_date):
+        print(f'Applying {len(delta)} changes to the opportunity store')
+        apply_delta(db_path, delta, today_date)
+    else:
+        print('Building the opportunity store')
+        build_store(df_clean, db_path, today_date)
+        return
+
+    # Stores built before the search index get it on their next update
+    with connect(db_path) as con:
+        create_search_index(con)
+        con.commit()
+
+
+def filter_conditions(agency_name=None, agency_code=None, close_after=None, close_before=None,
+                      category=None, eligible_applicants=None, min_funding=None, max_funding=None,
+                      table=TABLE):
+    # SQL conditions and their parameters for the store filters; every
+    # argument left as None is not filtered on. close_after/close_before
+    # are inclusive dates, min_funding/max_funding inclusive amounts of
+    # EstimatedTotalProgramFunding.
+    conditions = []
+    params = []
+    for col, value in (('AgencyName', agency_name), ('AgencyCode', agency_code),
+                       ('CategoryOfFundingActivity', category),
+                       ('EligibleApplicants', eligible_applicants)):
+        if value is not None:
+            conditions.append(f'{table}.{col} = ?')
+            params.append(value)
+    if close_after is not None:
+        conditions.append(f'{table}.CloseDate >= ?')
+        params.append(pd.Timestamp(close_after).strftime('%Y-%m-%d'))
+    if close_before is not None:
+        conditions.append(f'{table}.CloseDate <= ?')
+        params.append(pd.Timestamp(close_before).strftime('%Y-%m-%d'))
+    if min_funding is not None:
+        conditions.append(f'{table}.EstimatedTotalProgramFunding >= ?')
+        params.append(min_funding)
+    if max_funding is not None:
+        conditions.append(f'{table}.EstimatedTotalProgramFunding <= ?')
+        params.append(max_funding)
+    return conditions, params
+
+
+def query_opportunities(db_path, agency_name=None, agency_code=None, close_after=None,
+                        close_before=None, category=None, eligible_applicants=None,
+                        min_funding=None, max_funding=None, columns=None):
+    # Filter the store on the indexed columns (see filter_conditions)
+    conditions, params = filter_conditions(agency_name, agency_code, close_after, close_before,
+                                           category, eligible_applicants, min_funding, max_funding)
+
+    select = ', '.join(columns) if columns else '*'
+    sql = f'SELECT {select} FROM {TABLE}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+
+    with connect(db_path) as con:
+        df = pd.read_sql_query(sql, con, params=params)
+    return restore_dtypes(df)
+
+
+def match_expression(keywords):
+    # Quote every word, so punctuation ("COVID-19", "K-12") is never read
+    # as FTS5 syntax; the words are all required, in any order
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', keywords))
+
+
+def search_opportunities(db_path, keywords, limit=50, raw_query=False, columns=None, **filters):
+    # Opportunities matching keywords in their title, description, category
+    # explanation or eligibility text, best match first, with a score
+    # column (higher is better). filters are those of query_opportunities.
+    # With raw_query=True keywords is passed on as an FTS5 query, e.g.
+    # 'broadband AND (rural OR tribal)' or '"mental health" NEAR/5 youth'.
+    match = keywords if raw_query else match_expression(keywords)
+    if not match:
+        raise ValueError('No keywords to search for')
+    conditions, params = filter_conditions(**filters)
+    weights = ', '.join(str(weight) for weight in SEARCH_COLUMNS.values())
+
+    select = ', '.join(f'{TABLE}.{col}' for col in columns) if columns else f'{TABLE}.*'
+    sql = f'''
+        SELECT {select}, -bm25({SEARCH_TABLE}, {weights}) AS score
+        FROM {SEARCH_TABLE} JOIN {TABLE} ON {TABLE}.rowid = {SEARCH_TABLE}.rowid
+        WHERE {' AND '.join([f'{SEARCH_TABLE} MATCH ?'] + conditions)}
+        ORDER BY score DESC
+        LIMIT ?
+    '''
+    with connect(db_path) as con:
+        df = pd.read_sql_query(sql, con, params=[match] + params + [limit])
+    return restore_dtypes(df)
+
+
+def agency_funding(db_path, today=None):
+    # download_and_clean_raw_data.agencies() computed in SQL. CloseDate is
+    # compared by day, so opportunities closing today are still counted.
+    today = (today or datetime.today()).strftime('%Y-%m-%d')
+    sql = f'''
+        SELECT AgencyName, SUM(EstimatedTotalProgramFunding) AS EstimatedTotalProgramFunding
+        FROM {TABLE}
+        WHERE CloseDate >= ?
+        GROUP BY AgencyName
+        HAVING SUM(EstimatedTotalProgramFunding) > 0
+        ORDER BY EstimatedTotalProgramFunding DESC
+    '''
+    with connect(db_path) as con:
+        agencies = pd.read_sql_query(sql, con, params=[today])
+    return agencies.assign(in_MM = lambda x: x.EstimatedTotalProgramFunding/1000000)
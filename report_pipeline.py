@@ -0,0 +1,103 @@
+'''
+Render the reports concurrently in a process pool.
+
+Each report is a stage: a function, its keyword arguments and the stages it
+depends on. A stage is submitted as soon as everything it depends on has
+finished, so independent stages (the bubble plot, the charts of different
+agencies) run side by side while e.g. a PDF still waits for the line chart
+it embeds.
+
+Workers only receive what their stage needs (the aggregate cube, or the
+rows of the bubble plot), never the full cleaned frame.
+'''
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import aggregates
+from reports import (BUBBLE_COLUMNS, create_agency_bubble_plots, create_agency_reports, create_bubble_plot,
+                     create_line_chart, create_pdf)
+
+
+def run_stages(stages, max_workers=None):
+    # stages maps a stage name to (function, kwargs, names of the stages
+    # it depends on). Raises the first error any stage raised.
+    for name, (_, _, depends_on) in stages.items():
+        missing = [dep for dep in depends_on if dep not in stages]
+        if missing:
+            raise ValueError(f'Stage {name!r} depends on unknown stages {missing}')
+
+    pending = dict(stages)
+    running = {}
+    done = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, (func, kwargs, depends_on) in list(pending.items()):
+                if all(dep in done for dep in depends_on):
+                    running[pool.submit(func, **kwargs)] = name
+                    del pending[name]
+
+            if not running:
+                raise ValueError(f'Stages {sorted(pending)} depend on each other')
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result()
+                done.add(name)
+                print(f'Rendered {name}')
+    return done
+
+
+def report_stages(df_clean, cube, today_date, agencies=None, out_dir='.', batches=1):
+    # The default reports (line chart, Department of Education PDF, bubble
+    # plot) plus a chart and a PDF for every agency in agencies, split into
+    # batches of create_agency_reports calls
+    stages = {
+        'line_chart': (create_line_chart,
+                       dict(df_clean=None, today_date=today_date, cube=cube,
+                            filename=os.path.join(out_dir, 'line_chart.png')),
+                       []),
+        'pdf': (create_pdf,
+                dict(df_clean=None, today=today_date, cube=cube,
+                     filename=os.path.join(out_dir, 'Current_Opportunities.pdf'),
+                     chart_file=os.path.join(out_dir, 'line_chart.png')),
+                ['line_chart']),
+    }
+
+    # The bubble plots only need a few columns of the open opportunities.
+    # Their points are binned by week and the HTML files share one copy of
+    # plotly.js in out_dir.
+    today = datetime.now()
+    open_rows = df_clean.loc[df_clean['CloseDate'] >= today, BUBBLE_COLUMNS]
+    stages['bubble'] = (create_bubble_plot,
+                        dict(df_clean=open_rows[open_rows['AgencyName'].isin(aggregates.top_agencies(cube, 20))],
+                             filename=os.path.join(out_dir, 'Bubble.html'), cube=cube, show=False,
+                             bin_days=7, plotlyjs='directory'),
+                        [])
+
+    agencies = list(agencies or [])
+    if agencies:
+        # After 'bubble', which writes the shared plotly.min.js
+        stages['agency_bubbles'] = (create_agency_bubble_plots,
+                                    dict(df_clean=open_rows[open_rows['AgencyName'].isin(agencies)],
+                                         agencies=agencies, out_dir=out_dir),
+                                    ['bubble'])
+    for batch in range(min(batches, len(agencies))):
+        batch_agencies = agencies[batch::batches]
+        stages[f'agencies:{batch}'] = (
+            create_agency_reports,
+            dict(df_clean=None, today=today_date, agencies=batch_agencies, out_dir=out_dir,
+                 cube=cube[cube['AgencyName'].isin(batch_agencies)]),
+            [])
+    return stages
+
+
+def render_reports(df_clean, cube, today_date, agencies=None, out_dir='.', max_workers=None):
+    # agencies='all' renders every agency that has open opportunities
+    os.makedirs(out_dir, exist_ok=True)
+    if agencies == 'all':
+        agencies = aggregates.agency_totals(cube, today_date)['AgencyName'].tolist()
+    batches = max_workers or os.cpu_count() or 1
+    stages = report_stages(df_clean, cube, today_date, agencies, out_dir, batches)
+    return run_stages(stages, max_workers=max_workers)
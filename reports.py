@@ -0,0 +1,294 @@
+'''
+Charts and PDFs of the cleaned grants.gov data.
+
+These used to live in download_and_clean_raw_data; they were split out so
+that the ingest path (download, parse, clean) starts without matplotlib,
+reportlab or plotly. Their old names can still be imported from
+download_and_clean_raw_data, which loads this module on first use.
+
+plotly is only imported by the bubble plots. The report font (REPORT_RC) is
+applied to the report figures only, instead of to matplotlib's global
+rcParams.
+'''
+from datetime import datetime
+import os
+import re
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib as mpl
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, Image
+
+import aggregates
+
+# Arial or a similar sans-serif font
+REPORT_RC = {'font.family': 'sans-serif', 'font.sans-serif': 'Arial'}
+
+
+def draw_line_chart(fig, monthly_funding, filename):
+    # Draw the monthly funding on fig (reused between charts) and save it,
+    # in the report font without changing the global rcParams
+    with mpl.rc_context(REPORT_RC):
+        fig.clear()
+        ax = fig.add_subplot()
+
+        # Convert funding to millions for the Y axis
+        monthly_funding_in_millions = monthly_funding / 1e6
+
+        # Plotting
+        ax.plot(monthly_funding_in_millions.index.astype(str), monthly_funding_in_millions.values,
+                marker='', linestyle='-', linewidth=1)
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.set_xlabel('Month')
+        ax.set_ylabel('In Million')
+        ax.set_title('Estimated Total Program Funding')
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        fig.tight_layout()
+
+        # Save the plot as an image
+        fig.savefig(filename)
+
+
+def create_line_chart(df_clean, today_date, cube=None, agency_name=None, filename='line_chart.png'):
+    # The monthly totals come from the aggregate cube (built here when the
+    # caller does not pass one), so df_clean is no longer modified
+    if cube is None:
+        cube = aggregates.build_cube(df_clean, today_date)
+
+    # Sum the funding by close month for the next 12 months
+    # (for a single agency when agency_name is given)
+    next_12_months = pd.period_range(start=datetime.now(), periods=12, freq='M')
+    monthly_funding = aggregates.monthly_funding(cube, next_12_months, agency_name)
+
+    fig = plt.figure(figsize=(6, 2))  # Adjust the size to fit 1/3rd of the PDF page height
+    draw_line_chart(fig, monthly_funding, filename)
+    plt.close(fig)
+
+
+def write_pdf(filename, agency_name, formatted_funding, chart_file, styles):
+    # Lay out one Current Opportunities PDF; styles is a reportlab
+    # stylesheet that can be shared between PDFs
+
+    # Create a canvas
+    c = canvas.Canvas(filename, pagesize=letter)
+
+    # Define title and sub-header
+    title = "Current Opportunities"
+    today_date = datetime.now().strftime("%B %d, %Y")  # Date in long format
+
+    # Add title and sub-header to the canvas
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(inch, 10*inch, title)
+    c.setFont("Helvetica", 12)
+    c.drawString(inch, 9.75*inch, today_date)
+
+    # Create a paragraph with three generic sentences
+    if agency_name == "Department of Education":
+        paragraph_text = (
+            "In the realm of educational advancement, the Department of Education consistently offers a multitude of "
+            "grant opportunities, aiming to foster innovation and progress in learning environments. Key values essential "
+            "for the success of these grants include a deep commitment to educational equity, a thorough understanding of "
+            "pedagogical best practices, and a strong alignment of project goals with the Department's vision. Currently, "
+            f"there is a notable Estimated Total Program Funding of {formatted_funding}, accessible as of {today_date}, "
+            "a testament to the Department's dedication to empowering educational initiatives. Successful grant applications "
+            "typically demonstrate not only a robust educational impact but also a sustainable and scalable model, ensuring "
+            "that the benefits of the grant extend beyond the immediate project scope and contribute meaningfully to the "
+            "broader educational landscape."
+        )
+    else:
+        paragraph_text = (
+            f"The {agency_name} currently offers grant opportunities with a notable Estimated Total Program Funding of "
+            f"{formatted_funding}, accessible as of {today_date}. Successful grant applications typically demonstrate "
+            "a clear impact, a strong alignment of project goals with the agency's mission, and a sustainable and "
+            "scalable model, ensuring that the benefits of the grant extend beyond the immediate project scope."
+        )
+    paragraph = Paragraph(paragraph_text, style=styles["Normal"])
+
+    # Draw the paragraph on the canvas
+    paragraph.wrapOn(c, 6.5*inch, 9*inch)
+    paragraph.drawOn(c, inch, 8*inch)
+
+    chart_image = Image(chart_file)
+    chart_image.drawHeight = 3*inch  # Adjust the height to 1/3rd of the page height
+    chart_image.drawWidth = 7*inch  # Adjust the width to fit the page
+    chart_image.wrapOn(c, 7.5*inch, 9*inch)
+    chart_image.drawOn(c, inch, 5*inch)  # Adjust the position as needed
+
+    # Additional paragraph text
+    additional_paragraph_text = ("As we can see, there are millions of dollars in funding available for the next 12 months."
+                                "The chart above shows the estimated total program funding by month for the next 12 months."
+                                "The chart was created using Python and the Pandas and Matplotlib libraries."
+                                "Contact us to learn more about how we can help you with your grant application.")
+
+    # Create a Paragraph object with the additional paragraph
+    additional_paragraph = Paragraph(additional_paragraph_text, style=styles["Normal"])
+
+    # Draw the additional paragraph on the canvas
+    additional_paragraph.wrapOn(c, 6.5*inch, 9*inch)
+    additional_paragraph.drawOn(c, inch, 4*inch)  # Adjust the position as needed
+    # Save the PDF
+    c.save()
+
+
+def create_pdf(df_clean, today, cube=None, agency_name="Department of Education",
+               filename="Current_Opportunities.pdf", chart_file='line_chart.png'):
+    # chart_file is the line chart create_line_chart wrote for the same agency
+    if cube is None:
+        cube = aggregates.build_cube(df_clean, today)
+
+    # Funding of the agency's opportunities that are still open
+    DE = aggregates.open_cells(cube, today).query('AgencyName == @agency_name')
+
+    #This is the method to format and sum the EstimatedTotalProgramFunding column
+    #and print the results to the console for easy sharing.
+    formatted_funding = "${:,.0f}".format(DE["EstimatedTotalProgramFunding"].sum())
+
+    write_pdf(filename, agency_name, formatted_funding, chart_file, getSampleStyleSheet())
+
+
+def agency_file_name(agency_name):
+    # "Department of Education" -> "Department_of_Education"
+    return re.sub(r'[^A-Za-z0-9]+', '_', agency_name).strip('_')
+
+
+def create_agency_reports(df_clean, today, agencies=None, out_dir='.', cube=None):
+    # Write line_chart_<agency>.png and Current_Opportunities_<agency>.pdf
+    # for every agency in agencies (default: every agency in the data).
+    # The data is partitioned by agency once, and the matplotlib figure and
+    # the reportlab stylesheet are shared by all agencies.
+    os.makedirs(out_dir, exist_ok=True)
+
+    if cube is None:
+        cube = aggregates.build_cube(df_clean, today)
+    if agencies is not None:
+        cube = cube[cube['AgencyName'].isin(agencies)]
+
+    next_12_months = pd.period_range(start=datetime.now(), periods=12, freq='M')
+    open_cube = aggregates.open_cells(cube, today)
+    open_funding = open_cube.groupby('AgencyName', observed=True)['EstimatedTotalProgramFunding'].sum()
+
+    fig = plt.figure(figsize=(6, 2))
+    styles = getSampleStyleSheet()
+    written = []
+    try:
+        for agency_name, agency_cube in cube.groupby('AgencyName', observed=True):
+            name = agency_file_name(agency_name)
+            chart_file = os.path.join(out_dir, f'line_chart_{name}.png')
+            pdf_file = os.path.join(out_dir, f'Current_Opportunities_{name}.pdf')
+
+            monthly_funding = aggregates.monthly_funding(agency_cube, next_12_months)
+            draw_line_chart(fig, monthly_funding, chart_file)
+
+            formatted_funding = "${:,.0f}".format(open_funding.get(agency_name, 0))
+            write_pdf(pdf_file, agency_name, formatted_funding, chart_file, styles)
+            written.append(pdf_file)
+    finally:
+        plt.close(fig)
+    return written
+
+
+BUBBLE_COLUMNS = ['AgencyName', 'CloseDate', 'ExpectedNumberOfAwards', 'EstimatedTotalProgramFunding']
+
+
+def bubble_points(grants_data, today, bin_days=None):
+    # Points of the bubble plot: every opportunity that closes after today,
+    # or with bin_days one point per agency and bin_days-wide range of days
+    # until close, holding the summed awards and funding of the range
+    points = (grants_data
+              .assign(DaysUntilClose = lambda x: (x['CloseDate'] - today).dt.days)
+              .query('DaysUntilClose > 0'))
+    # Plain float columns are written as compact binary arrays
+    numbers = {'ExpectedNumberOfAwards': 'float64', 'EstimatedTotalProgramFunding': 'float64'}
+    if not bin_days:
+        return points[['AgencyName', 'DaysUntilClose'] + list(numbers)].astype(numbers)
+
+    return (points
+            .assign(DaysUntilClose = lambda x: x.DaysUntilClose // bin_days * bin_days)
+            .groupby(['AgencyName', 'DaysUntilClose'], observed=True)
+            .agg(ExpectedNumberOfAwards=('ExpectedNumberOfAwards', 'sum'),
+                 EstimatedTotalProgramFunding=('EstimatedTotalProgramFunding', 'sum'),
+                 Opportunities=('EstimatedTotalProgramFunding', 'size'))
+            .reset_index()
+            .astype(numbers))
+
+
+def draw_bubble_plot(points, filename, title, plotlyjs=True, show=False):
+    # plotlyjs is plotly's include_plotlyjs: True inlines plotly.js (about
+    # 3.5 MB) in every file, 'cdn' links to it online and 'directory' links
+    # to one plotly.min.js written next to the HTML and shared by every
+    # chart in that directory
+    # plotly is only needed here, so it is not loaded with the other reports
+    import plotly.express as px
+
+    binned = 'Opportunities' in points.columns
+    fig = px.scatter(
+        points,
+        x="DaysUntilClose",
+        y="ExpectedNumberOfAwards",
+        size="EstimatedTotalProgramFunding",
+        color="AgencyName",
+        hover_name=None if binned else "AgencyName",
+        hover_data=['Opportunities'] if binned else None,
+        size_max=60,
+        title=title
+    )
+
+    if show:
+        fig.show()
+
+    fig.write_html(filename, include_plotlyjs=plotlyjs)
+
+
+def create_bubble_plot(df_clean=None, filename="Bubble.html", cube=None, show=True, bin_days=None, plotlyjs=True):
+    # Plot df_clean when it is given, otherwise load the dataset from a CSV.
+    # bin_days and plotlyjs make the file smaller (see bubble_points and
+    # draw_bubble_plot); the defaults give one bubble per opportunity and a
+    # self-contained file.
+    if df_clean is None:
+        file_path = r"C:\Python\Grants_dot_gov\GrantsDBExtract20211006v2.csv"  # Update with the path to your data file
+        grants_data = pd.read_csv(file_path)
+        grants_data['CloseDate'] = pd.to_datetime(grants_data['CloseDate'], errors='coerce')
+    else:
+        grants_data = df_clean
+
+    # # Handle NaN values in 'EstimatedTotalProgramFunding'
+    filtered_data = grants_data.dropna(subset=['EstimatedTotalProgramFunding'])
+
+    # Group by AgencyName and sum the EstimatedTotalProgramFunding, then take the top 20
+    if cube is not None:
+        top_agencies = aggregates.top_agencies(cube, 20)
+    else:
+        top_agencies = filtered_data.groupby('AgencyName', observed=True)['EstimatedTotalProgramFunding'].sum().nlargest(20).index
+
+    # Filter the dataset for only these top agencies
+    filtered_data = filtered_data[filtered_data['AgencyName'].isin(top_agencies)]
+    points = bubble_points(filtered_data, datetime.now(), bin_days)
+
+    # Create the bubble plot with the adjusted data
+    draw_bubble_plot(points, filename, "Bubble Plot of Grant Opportunities by Top Funding Agencies",
+                     plotlyjs=plotlyjs, show=show)
+
+
+def create_agency_bubble_plots(df_clean, agencies=None, out_dir='.', bin_days=7, plotlyjs='directory'):
+    # Bubble_<agency>.html for every agency in agencies (default: all of
+    # them). By default the points are binned by week and all files share
+    # one plotly.min.js in out_dir. Returns the files written.
+    os.makedirs(out_dir, exist_ok=True)
+    grants_data = df_clean.dropna(subset=['EstimatedTotalProgramFunding'])
+    if agencies is not None:
+        grants_data = grants_data[grants_data['AgencyName'].isin(agencies)]
+    points = bubble_points(grants_data, datetime.now(), bin_days)
+
+    written = []
+    for agency_name, agency_points in points.groupby('AgencyName', observed=True):
+        filename = os.path.join(out_dir, f'Bubble_{agency_file_name(agency_name)}.html')
+        draw_bubble_plot(agency_points, filename, f"Grant Opportunities of {agency_name}", plotlyjs=plotlyjs)
+        written.append(filename)
+    return written
@@ -0,0 +1,113 @@
+'''
+On-disk cache of the cleaned grants.gov frame.
+
+The cleaned DataFrame is stored as an uncompressed Arrow (Feather V2) file,
+so categoricals, nullable integers and dates come back exactly as clean_df
+produced them, and the file can be memory-mapped on load.
+
+Snapshots are keyed by the extract date and a fingerprint of the parser,
+clean_df and its COLUMN_SCHEMA, so a change to the code that decides the
+cleaned frame (down to the categorical encoding done while parsing) never
+serves a stale frame.
+'''
+import glob
+import hashlib
+import inspect
+import json
+import os
+
+# Bump this when the layout of the cached files changes
+CACHE_VERSION = 1
+
+# The code that decides what the cleaned frame looks like: the parser
+# builds the categoricals, clean_df converts everything else
+FINGERPRINT_FUNCTIONS = ['iter_xml_batches', 'encoded_categorical', 'xml_to_df', 'to_float', 'convert_column',
+                         'clean_df', 'concat_clean']
+
+
+def clean_df_fingerprint():
+    # Hash the parsing and cleaning code and the column schema, so editing
+    # any of them invalidates the cache
+    import download_and_clean_raw_data
+
+    source = ''.join(inspect.getsource(getattr(download_and_clean_raw_data, name))
+                     for name in FINGERPRINT_FUNCTIONS) \
+        + repr(sorted(download_and_clean_raw_data.COLUMN_SCHEMA.items()))
+    digest = hashlib.sha1(f'{CACHE_VERSION}\n{source}'.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def snapshot_path(cache_space, today_date):
+    file_name = f"GrantsDBClean{today_date}_{clean_df_fingerprint()}.arrow"
+    return os.path.join(cache_space, file_name)
+
+
+# pyarrow and the cleaning code are imported where they are used, so the
+# downloader can share write_json without loading pandas
+
+def read_frame(path):
+    # Memory-map the Arrow file rather than reading it into a buffer first
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas()
+
+
+def write_frame(df, path):
+    # Write next to the target and rename, so a crash never leaves a
+    # truncated file under the final name
+    import pyarrow.feather as feather
+
+    feather.write_feather(df, path + '.part', compression='uncompressed')
+    os.replace(path + '.part', path)
+    return path
+
+
+def write_json(obj, path):
+    # Same write-then-rename as write_frame, for the metadata files
+    with open(path + '.part', 'w') as f:
+        json.dump(obj, f)
+    os.replace(path + '.part', path)
+    return path
+
+
+def load_snapshot(cache_space, today_date):
+    path = snapshot_path(cache_space, today_date)
+    if not os.path.exists(path):
+        return None
+
+    print('Loading cleaned data from cache')
+    return read_frame(path)
+
+
+def save_snapshot(df_clean, cache_space, today_date):
+    os.makedirs(cache_space, exist_ok=True)
+    return write_frame(df_clean, snapshot_path(cache_space, today_date))
+
+
+def latest_snapshot(cache_space):
+    # (extract date, path) of the newest snapshot written by the current
+    # clean_df, or (None, None) when there is none
+    fingerprint = clean_df_fingerprint()
+    snapshots = glob.glob(os.path.join(cache_space, f'GrantsDBClean*_{fingerprint}.arrow'))
+    dated = [(os.path.basename(path)[len('GrantsDBClean'):].partition('_')[0], path) for path in snapshots]
+    return max(dated, default=(None, None))
+
+
+def evict_snapshots(cache_space, keep_days=7):
+    # Keep the newest keep_days extract dates for the current clean_df;
+    # snapshots written by an older clean_df are always removed.
+    fingerprint = clean_df_fingerprint()
+    snapshots = glob.glob(os.path.join(cache_space, 'GrantsDBClean*_*.arrow'))
+
+    current = []
+    for path in snapshots:
+        date, _, file_fingerprint = os.path.basename(path)[len('GrantsDBClean'):-len('.arrow')].partition('_')
+        if file_fingerprint == fingerprint:
+            current.append((date, path))
+        else:
+            os.remove(path)
+
+    current.sort(reverse=True)
+    for _, path in current[keep_days:]:
+        os.remove(path)
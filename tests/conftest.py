@@ -0,0 +1,50 @@
+'''
+Two consecutive synthetic extracts shared by the incremental tests.
+
+DAY2 drops every 20th opportunity of DAY1, updates (LastUpdatedDate,
+funding and title) every 15th of the rest and adds 40 new ones.
+'''
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+import incremental
+from synthetic_extract import synthetic_raw_df
+
+DAY1, DAY2, DAY3 = '20261015', '20261016', '20261017'
+ROWS, REMOVED_EVERY, UPDATED_EVERY, INSERTED = 400, 20, 15, 40
+UPDATED_TITLE = 'Quokka habitat restoration'
+
+
+def two_day_extracts():
+    # {date: raw extract}; the first ROWS records of a longer synthetic
+    # extract with the same seed are the same, so its tail is new
+    day1 = synthetic_raw_df(ROWS, DAY1, seed=1)
+    new = synthetic_raw_df(ROWS + INSERTED, DAY1, seed=1).iloc[ROWS:]
+
+    kept = day1.drop(index=day1.index[::REMOVED_EVERY])
+    updated = kept.index[::UPDATED_EVERY]
+    kept.loc[updated, 'LastUpdatedDate'] = DAY2[4:] + DAY2[:4]
+    kept.loc[updated, 'EstimatedTotalProgramFunding'] = '7000000'
+    kept.loc[updated, 'OpportunityTitle'] = UPDATED_TITLE
+    return {DAY1: day1, DAY2: pd.concat([kept, new], ignore_index=True)}
+
+
+@pytest.fixture
+def extracts():
+    return two_day_extracts()
+
+
+@pytest.fixture
+def store_space(tmp_path):
+    return str(tmp_path / 'store')
+
+
+@pytest.fixture
+def incremental_run(store_space, extracts):
+    # {date: (store, delta)} of apply_extract over both days
+    return {date: incremental.apply_extract(raw, store_space, date) for date, raw in extracts.items()}
@@ -0,0 +1,30 @@
+'''
+aggregates.refresh_cube patched with the incremental deltas.
+
+    python -m pytest tests
+'''
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aggregates
+from conftest import DAY2
+from download_and_clean_raw_data import clean_df
+
+
+def sorted_cube(cube):
+    return cube.sort_values(aggregates.DIMENSIONS).reset_index(drop=True)
+
+
+def test_patched_cube_matches_rebuild(tmp_path, extracts, incremental_run, capsys):
+    cube_space = str(tmp_path / 'store')
+    for date, (store, delta) in incremental_run.items():
+        cube = aggregates.refresh_cube(cube_space, store, date, delta)
+    assert 'Updating the aggregate cube' in capsys.readouterr().out
+
+    rebuilt = aggregates.build_cube(clean_df(extracts[DAY2]), DAY2)
+    pd.testing.assert_frame_equal(sorted_cube(cube), sorted_cube(rebuilt), check_categorical=False)
+    pd.testing.assert_frame_equal(aggregates.agency_totals(cube, DAY2), aggregates.agency_totals(rebuilt, DAY2),
+                                  check_categorical=False)
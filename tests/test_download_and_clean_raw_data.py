@@ -0,0 +1,129 @@
+'''
+Streaming XML parser (iter_xml_batches / xml_to_df) on synthetic extracts.
+
+    python -m pytest tests
+'''
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from download_and_clean_raw_data import COLUMN_SCHEMA, REPORT_COLUMNS, clean_df, concat_clean, xml_to_df
+from synthetic_extract import NAMESPACE, synthetic_raw_df, write_extract_xml
+
+
+def extract_xml(rows=300, extract_date='20261016', seed=2):
+    f = io.BytesIO()
+    write_extract_xml(f, rows, extract_date, seed)
+    return f.getvalue()
+
+
+def document(*records):
+    # An extract holding the given {field: text} synopses
+    body = ''.join('<OpportunitySynopsisDetail_1_0>%s</OpportunitySynopsisDetail_1_0>'
+                   % ''.join(f'<{name}>{text}</{name}>' for name, text in record.items())
+                   for record in records)
+    return f'<?xml version="1.0" encoding="UTF-8"?><Grants xmlns="{NAMESPACE}">{body}</Grants>'.encode()
+
+
+def test_chunked_parse_matches_full_parse():
+    data = extract_xml()
+    full = xml_to_df(io.BytesIO(data))
+    chunks = list(xml_to_df(io.BytesIO(data), chunksize=70))
+    assert [len(chunk) for chunk in chunks] == [70, 70, 70, 70, 20]
+
+    pd.testing.assert_frame_equal(concat_clean(chunks), full)
+    pd.testing.assert_frame_equal(concat_clean(clean_df(chunk) for chunk in chunks), clean_df(full))
+
+
+def test_parse_matches_synthetic_frame():
+    # Forecasts are skipped and a repeated field keeps its last value
+    full = xml_to_df(io.BytesIO(extract_xml()))
+    raw = synthetic_raw_df(300, '20261016', seed=2)
+    pd.testing.assert_frame_equal(full.astype(object), raw.astype(object))
+
+
+def test_field_missing_from_first_record_is_back_filled():
+    data = document({'OpportunityID': '1', 'AgencyName': 'NSF'},
+                    {'OpportunityID': '2', 'AgencyName': 'NSF', 'Description': 'text'},
+                    {'OpportunityID': '3', 'AgencyCode': 'ED'})
+    for df in [xml_to_df(io.BytesIO(data)), concat_clean(xml_to_df(io.BytesIO(data), chunksize=1))]:
+        assert df['OpportunityID'].tolist() == ['1', '2', '3']
+        assert df['Description'].isna().tolist() == [True, False, True]
+        assert df['AgencyName'].isna().tolist() == [False, False, True]
+        assert df['AgencyCode'].isna().tolist() == [True, True, False]
+
+
+def test_empty_document():
+    data = document()
+    assert len(xml_to_df(io.BytesIO(data))) == 0
+    assert list(xml_to_df(io.BytesIO(data), chunksize=10)) == []
+
+
+def filtered_ids(data, filters, columns=None):
+    return xml_to_df(io.BytesIO(data), columns=columns, filters=filters)['OpportunityID'].tolist()
+
+
+def test_filters_match_pandas():
+    data = extract_xml()
+    df = clean_df(xml_to_df(io.BytesIO(data)))
+    funding = df['EstimatedTotalProgramFunding']
+
+    expected = df[df['AgencyCode'].isin(['ED', 'NSF']) & (funding >= 1_000_000).fillna(False)]
+    ids = filtered_ids(data, [('AgencyCode', 'in', ['ED', 'NSF']), ('EstimatedTotalProgramFunding', '>=', 1_000_000)])
+    assert ids == expected['OpportunityID'].tolist() and ids
+
+    expected = df[~df['AgencyCode'].isin(['ED', 'NSF']) & (df['CloseDate'] < pd.Timestamp('2026-10-16'))]
+    ids = filtered_ids(data, [('AgencyCode', 'not in', ['ED', 'NSF']), ('CloseDate', '<', '2026-10-16')])
+    assert ids == expected['OpportunityID'].tolist() and ids
+
+    expected = df[(df['ExpectedNumberOfAwards'] == 10).fillna(False)]
+    assert filtered_ids(data, [('ExpectedNumberOfAwards', '==', 10)]) == expected['OpportunityID'].tolist()
+
+
+def test_columns_and_filter_on_other_field():
+    # A field only read for a filter is not kept
+    data = extract_xml()
+    df = xml_to_df(io.BytesIO(data), columns=REPORT_COLUMNS, filters=[('PostDate', '>=', '2026-01-01')])
+    assert list(df.columns) == REPORT_COLUMNS
+
+    full = clean_df(xml_to_df(io.BytesIO(data)))
+    assert df['OpportunityID'].tolist() == full.loc[full['PostDate'] >= '2026-01-01', 'OpportunityID'].tolist()
+
+
+def test_unknown_filter_operator():
+    with pytest.raises(ValueError, match='Unknown filter operator'):
+        xml_to_df(io.BytesIO(document()), filters=[('AgencyCode', 'like', 'ED')])
+
+
+def test_categorical_fields_are_encoded_while_parsing():
+    data = extract_xml()
+    df = xml_to_df(io.BytesIO(data))
+    raw = synthetic_raw_df(300, '20261016', seed=2)
+    categorical = [name for name, dtype in COLUMN_SCHEMA.items() if dtype == 'category' and name in df]
+    assert categorical
+    for name in categorical:
+        assert isinstance(df[name].dtype, pd.CategoricalDtype)
+        # Same sorted categories as pandas infers from the strings
+        assert df[name].cat.categories.tolist() == pd.Categorical(raw[name].dropna()).categories.tolist()
+        assert df[name].astype(object).tolist() == raw[name].astype(object).tolist()
+
+    # Cleaning the encoded frame gives what cleaning the strings gives
+    pd.testing.assert_frame_equal(clean_df(df), clean_df(raw), check_categorical=False)
+
+
+def test_later_chunks_add_categories():
+    data = document({'OpportunityID': '1', 'AgencyCode': 'NSF'},
+                    {'OpportunityID': '2', 'AgencyCode': 'ED'},
+                    {'OpportunityID': '3', 'AgencyCode': 'NSF'})
+    first, second, third = xml_to_df(io.BytesIO(data), chunksize=1)
+    assert first['AgencyCode'].cat.categories.tolist() == ['NSF']
+    assert second['AgencyCode'].cat.categories.tolist() == ['ED', 'NSF']
+
+    df = concat_clean([first, second, third])
+    assert isinstance(df['AgencyCode'].dtype, pd.CategoricalDtype)
+    assert df['AgencyCode'].tolist() == ['NSF', 'ED', 'NSF']
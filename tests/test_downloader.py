@@ -0,0 +1,134 @@
+'''
+downloader against a local stand-in for the S3 extract bucket.
+
+The server answers like S3: the ETag is the MD5 of the file, If-None-Match
+gets a 304, Range with a matching If-Range gets a 206 and keys that do not
+exist get a 403.
+
+    python -m pytest tests
+'''
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import downloader
+from snapshot_cache import write_json
+
+EXTRACT = os.urandom(300_000)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        name = self.path.rsplit('/', 1)[-1]
+        if name not in server.files:
+            self.send_response(403)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = server.files[name]
+        # The ETag can be made to disagree with the body to simulate a
+        # download corrupted on the way
+        etag = '"%s"' % server.etags.get(name, hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            start = int(self.headers['Range'][len('bytes='):].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.files = {'GrantsDBExtract20261016v2.zip': EXTRACT}
+    server.etags = {}
+    server.requests = []
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}/extracts'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(server, dest_path, date='20261016'):
+    with requests.Session() as session:
+        return downloader.fetch(downloader.extract_url(date, server.base_url), str(dest_path), session=session)
+
+
+def test_download_and_not_modified(server, tmp_path):
+    dest_path = tmp_path / 'GrantsDBExtract20261016v2.zip'
+    assert fetch(server, dest_path) == 'downloaded'
+    assert dest_path.read_bytes() == EXTRACT
+    assert downloader.is_complete(str(dest_path))
+    assert not os.path.exists(str(dest_path) + '.part')
+
+    assert fetch(server, dest_path) == 'not_modified'
+    assert server.requests[-1]['If-None-Match'] == '"%s"' % hashlib.md5(EXTRACT).hexdigest()
+    assert dest_path.read_bytes() == EXTRACT
+
+
+def test_missing_extract_falls_back(server, tmp_path):
+    with requests.Session() as session:
+        zip_path, date = downloader.fetch_extract(str(tmp_path), '20261017', fallback_days=1,
+                                                  base_url=server.base_url, session=session)
+    assert date == '20261016'
+    assert zip_path == str(tmp_path / 'GrantsDBExtract20261016v2.zip')
+    # 20261017 answered 403 like a missing S3 key, then 20261016 was fetched
+    assert len(server.requests) == 2
+    assert not os.path.exists(tmp_path / 'GrantsDBExtract20261017v2.zip')
+
+
+def test_module_base_url_is_read_at_call_time(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, 'EXTRACT_BASE_URL', server.base_url)
+    with requests.Session() as session:
+        zip_path, date = downloader.fetch_extract(str(tmp_path), '20261016', session=session)
+    assert date == '20261016' and len(server.requests) == 1
+
+
+def test_partial_download_is_resumed(server, tmp_path):
+    dest_path = tmp_path / 'GrantsDBExtract20261016v2.zip'
+    part_path = str(dest_path) + '.part'
+    with open(part_path, 'wb') as f:
+        f.write(EXTRACT[:100_000])
+    write_json({'etag': '"%s"' % hashlib.md5(EXTRACT).hexdigest(), 'last_modified': None},
+               part_path + '.meta.json')
+
+    assert fetch(server, dest_path) == 'downloaded'
+    assert server.requests[-1]['Range'] == 'bytes=100000-'
+    assert dest_path.read_bytes() == EXTRACT
+    assert downloader.read_meta(str(dest_path) + '.meta.json')['md5'] == hashlib.md5(EXTRACT).hexdigest()
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    server.etags['GrantsDBExtract20261016v2.zip'] = hashlib.md5(b'another file').hexdigest()
+    dest_path = tmp_path / 'GrantsDBExtract20261016v2.zip'
+
+    with pytest.raises(IOError, match='checksum'):
+        fetch(server, dest_path)
+    assert not os.path.exists(dest_path)
+    assert not os.path.exists(str(dest_path) + '.part')
+    assert not downloader.is_complete(str(dest_path))
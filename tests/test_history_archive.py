@@ -0,0 +1,66 @@
+'''
+history_archive over two consecutive synthetic extracts and a day without
+changes.
+
+    python -m pytest tests
+'''
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import history_archive
+import incremental
+from conftest import DAY1, DAY2, DAY3
+from download_and_clean_raw_data import clean_df
+
+
+def by_id(df):
+    return df.sort_values('OpportunityID').reset_index(drop=True)
+
+
+def archive(archive_space, incremental_run, with_delta=True):
+    for date, (store, delta) in incremental_run.items():
+        history_archive.archive_extract(archive_space, store, date, delta if with_delta else None)
+
+
+def test_as_of_returns_each_day(tmp_path, extracts, incremental_run):
+    archive_space = str(tmp_path / 'archive')
+    archive(archive_space, incremental_run)
+    for date, raw in extracts.items():
+        state = history_archive.as_of(archive_space, pd.Timestamp(date))
+        pd.testing.assert_frame_equal(by_id(state), by_id(clean_df(raw)), check_categorical=False)
+
+    assert history_archive.as_of(archive_space, '2026-10-14') is None
+    changes = history_archive.versions(archive_space)
+    assert changes['Removed'].sum() == (incremental_run[DAY2][1]['ChangeType'] == 'remove').sum()
+
+
+def test_delta_partition_matches_comparison(tmp_path, incremental_run):
+    # The partition taken from the delta is the one comparing with the
+    # previous state gives
+    from_delta, compared = str(tmp_path / 'from_delta'), str(tmp_path / 'compared')
+    archive(from_delta, incremental_run)
+    archive(compared, incremental_run, with_delta=False)
+    for date in incremental_run:
+        pd.testing.assert_frame_equal(by_id(pd.read_parquet(history_archive.partition_path(from_delta, date))),
+                                      by_id(pd.read_parquet(history_archive.partition_path(compared, date))),
+                                      check_categorical=False)
+
+
+def test_no_change_day(tmp_path, extracts, store_space, incremental_run):
+    archive_space = str(tmp_path / 'archive')
+    archive(archive_space, incremental_run)
+    store, delta = incremental.apply_extract(extracts[DAY2], store_space, DAY3)
+
+    assert history_archive.archive_extract(archive_space, store, DAY3, delta) == 0
+    assert not os.path.exists(history_archive.partition_path(archive_space, DAY3))
+    assert history_archive.archived_dates(archive_space) == [DAY1, DAY2, DAY3]
+    pd.testing.assert_frame_equal(history_archive.as_of(archive_space, DAY3),
+                                  history_archive.as_of(archive_space, DAY2))
+
+    # Archiving any of the dates again is a no-op
+    for date in [DAY1, DAY2, DAY3]:
+        assert history_archive.archive_extract(archive_space, store, date, delta) == 0
+    assert history_archive.archived_dates(archive_space) == [DAY1, DAY2, DAY3]
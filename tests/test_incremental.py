@@ -0,0 +1,55 @@
+'''
+incremental.apply_extract over two consecutive synthetic extracts.
+
+    python -m pytest tests
+'''
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import incremental
+from conftest import DAY1, DAY2, DAY3, INSERTED, REMOVED_EVERY, ROWS, UPDATED_EVERY
+from download_and_clean_raw_data import clean_df
+
+
+def by_id(df):
+    return df.sort_values('OpportunityID').reset_index(drop=True)
+
+
+def test_store_matches_full_clean(extracts, incremental_run):
+    store, _ = incremental_run[DAY2]
+    pd.testing.assert_frame_equal(by_id(store), by_id(clean_df(extracts[DAY2])), check_categorical=False)
+
+
+def test_delta(store_space, incremental_run):
+    _, delta = incremental_run[DAY2]
+    removed = len(range(0, ROWS, REMOVED_EVERY))
+    updated = len(range(0, ROWS - removed, UPDATED_EVERY))
+    assert delta['ChangeType'].value_counts().to_dict() == {
+        'insert': INSERTED, 'update': updated, 'remove': removed, 'replaced': updated}
+    assert delta.attrs['base_date'] == DAY1
+
+    saved = incremental.load_delta(store_space, DAY2)
+    pd.testing.assert_frame_equal(saved, delta)
+    assert saved.attrs['base_date'] == DAY1
+
+
+def test_full_build_writes_no_delta(store_space, incremental_run):
+    _, delta = incremental_run[DAY1]
+    assert delta is None
+    assert not any(os.path.exists(path) for path in incremental.delta_paths(store_space, DAY1))
+
+
+def test_no_change_day(extracts, store_space, incremental_run):
+    store, delta = incremental.apply_extract(extracts[DAY2], store_space, DAY3)
+    assert len(delta) == 0 and delta.attrs['base_date'] == DAY2
+    pd.testing.assert_frame_equal(by_id(store), by_id(incremental_run[DAY2][0]))
+
+
+def test_old_deltas_are_evicted(extracts, store_space, incremental_run):
+    incremental.apply_extract(extracts[DAY2], store_space, DAY3, keep_deltas=1)
+    assert incremental.load_delta(store_space, DAY2) is None
+    assert not os.path.exists(incremental.delta_paths(store_space, DAY2)[1])
+    assert incremental.load_delta(store_space, DAY3) is not None
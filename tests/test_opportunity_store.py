@@ -0,0 +1,56 @@
+'''
+opportunity_store kept up to date with the incremental deltas.
+
+    python -m pytest tests
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import opportunity_store
+from conftest import DAY1, DAY2, UPDATED_TITLE
+
+
+def store_counts(db_path):
+    # (opportunities, documents in the search index); the integrity check
+    # fails when the index does not match the table
+    table, search_table = opportunity_store.TABLE, opportunity_store.SEARCH_TABLE
+    with opportunity_store.connect(db_path) as con:
+        con.execute(f"INSERT INTO {search_table} ({search_table}) VALUES ('integrity-check')")
+        return (con.execute(f'SELECT count(*) FROM {table}').fetchone()[0],
+                con.execute(f'SELECT count(*) FROM {search_table}_docsize').fetchone()[0])
+
+
+def funding_by_id(df):
+    return (df.set_index('OpportunityID')['EstimatedTotalProgramFunding']
+            .astype('Float64').sort_index().to_dict())
+
+
+def test_delta_is_applied(tmp_path, incremental_run, capsys):
+    db_path = str(tmp_path / 'grants.sqlite')
+    for date, (store, delta) in incremental_run.items():
+        opportunity_store.update_store(db_path, store, date, delta)
+    assert 'Applying' in capsys.readouterr().out
+
+    store, delta = incremental_run[DAY2]
+    assert opportunity_store.store_extract_date(db_path) == DAY2
+    assert store_counts(db_path) == (len(store), len(store))
+    rows = opportunity_store.query_opportunities(db_path, columns=['OpportunityID', 'EstimatedTotalProgramFunding'])
+    assert funding_by_id(rows) == funding_by_id(store)
+
+    # Updated titles are searchable, removed opportunities are gone
+    found = opportunity_store.search_opportunities(db_path, UPDATED_TITLE, limit=len(store))
+    updated = delta.loc[delta['ChangeType'] == 'update', 'OpportunityID']
+    assert sorted(found['OpportunityID']) == sorted(updated)
+    removed = delta.loc[delta['ChangeType'] == 'remove', 'OpportunityID']
+    assert not set(removed) & set(rows['OpportunityID'])
+
+
+def test_missed_day_rebuilds(tmp_path, incremental_run, capsys):
+    # A store that is not at the delta's base date is rebuilt instead
+    db_path = str(tmp_path / 'grants.sqlite')
+    opportunity_store.update_store(db_path, incremental_run[DAY1][0], '20261014')
+    store, delta = incremental_run[DAY2]
+    opportunity_store.update_store(db_path, store, DAY2, delta)
+    assert 'Applying' not in capsys.readouterr().out
+    assert store_counts(db_path) == (len(store), len(store))